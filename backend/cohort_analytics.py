@@ -0,0 +1,372 @@
+"""
+Live cohort analytics for recruiter dashboards.
+
+Aggregates per exam (score distribution, per-question MCQ/SQL accuracy,
+per-test Python pass rates, tab-switch violations) are kept as running
+counters, updated once per graded submission. Reading them is a walk over
+the counters, independent of how many submissions there are.
+
+Each submission is first reduced to a compact event holding only what the
+aggregates need. The most recent events are kept, so a rebuild from the
+submissions tables (after a restart or a regrade) can add back submissions
+that weren't written to MySQL yet. The IDs of every submission counted,
+loaded or recorded, are kept too, so a submission recorded twice (a retried
+grading job, including one resumed after a restart whose row was already
+loaded) is only counted once.
+
+MCQ and SQL answers are judged against the current version of their exam,
+as regrade.py does; per-test Python outcomes are the ones stored at grading.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from datetime import timezone
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# The score distribution has this many equal-width buckets of the maximum score
+SCORE_BUCKETS = 10
+
+# Tab-switch count ranges reported for violations: (label, lowest, highest)
+TAB_SWITCH_RANGES = (("0", 0, 0), ("1-2", 1, 2), ("3-5", 3, 5), ("6+", 6, None))
+
+SELECT_SUBMISSIONS = """
+    SELECT id, exam_id, exam_version, mcq_score, sql_score, python_score, total_score, max_score,
+           tab_switch_count, violation_flag, answers, submitted_at
+    FROM submissions
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+SELECT_PYTHON_RESULTS = """
+    SELECT submission_id, problem_id, passed, total, points, timed_out, test_results
+    FROM submission_python_results
+    WHERE submission_id IN ({})
+"""
+
+
+def load_submissions(connection, after_id: str, batch_size: int) -> List[dict]:
+    """One batch of stored submissions after after_id, shaped like freshly graded ones (blocking)"""
+    with connection.cursor() as cursor:
+        cursor.execute(SELECT_SUBMISSIONS, (after_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+        cursor.execute(SELECT_PYTHON_RESULTS.format(", ".join(["%s"] * len(rows))), [row["id"] for row in rows])
+        python_rows = cursor.fetchall()
+    connection.commit()  # end the read snapshot so the next batch sees new rows
+
+    python_results, test_outcomes = {}, {}
+    for row in python_rows:
+        python_results.setdefault(row["submission_id"], {})[row["problem_id"]] = {
+            "passed": row["passed"],
+            "total": row["total"],
+            "points": float(row["points"]),
+            "timed_out": bool(row["timed_out"]),
+        }
+        if row["test_results"]:
+            test_outcomes.setdefault(row["submission_id"], {})[row["problem_id"]] = json.loads(row["test_results"])
+
+    return [
+        {
+            **row,
+            "answers": json.loads(row["answers"] or "{}"),
+            "python_results": python_results.get(row["id"], {}),
+            "python_test_outcomes": test_outcomes.get(row["id"], {}),
+            "violation_flag": bool(row["violation_flag"]),
+            "timestamp": row["submitted_at"].replace(tzinfo=timezone.utc).timestamp(),
+        }
+        for row in rows
+    ]
+
+
+def _ratio(part: float, whole: float) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+
+class ExamAggregate:
+    """Running counters for one exam"""
+
+    def __init__(self, exam_id: str):
+        self.exam_id = exam_id
+        self.submissions = 0
+        self.versions = Counter()
+        self.last_submission_at: Optional[float] = None
+        self.score_sums = Counter()
+        self.min_total: Optional[int] = None
+        self.max_total: Optional[int] = None
+        self.distribution = [0] * SCORE_BUCKETS
+        self.mcq: Dict[int, List[int]] = {}     # q_id -> [answered, correct]
+        self.sql: Dict[int, List[int]] = {}
+        self.python: Dict[str, dict] = {}       # problem_id -> counters, "tests": [[runs, passed], ...]
+        self.tab_switches = Counter()
+        self.tab_switch_total = 0
+        self.violations = 0
+
+    def add(self, event: dict):
+        self.submissions += 1
+        self.versions[event["exam_version"]] += 1
+        self.last_submission_at = max(self.last_submission_at or 0, event["timestamp"])
+
+        total = event["scores"]["total"]
+        self.score_sums.update(event["scores"])
+        self.min_total = total if self.min_total is None else min(self.min_total, total)
+        self.max_total = total if self.max_total is None else max(self.max_total, total)
+        if event["max_score"]:
+            bucket = int(total / event["max_score"] * SCORE_BUCKETS)
+            self.distribution[max(0, min(SCORE_BUCKETS - 1, bucket))] += 1
+
+        for counters, correct in ((self.mcq, event["mcq"]), (self.sql, event["sql"])):
+            for q_id, right in correct.items():
+                answered = counters.setdefault(q_id, [0, 0])
+                answered[0] += 1
+                answered[1] += right
+
+        for problem_id, result in event["python"].items():
+            problem = self.python.setdefault(problem_id, {"submitted": 0, "points": 0.0, "passed": 0, "total": 0,
+                                                         "timeouts": 0, "tests": []})
+            problem["submitted"] += 1
+            problem["points"] += result["points"]
+            problem["passed"] += result["passed"]
+            problem["total"] += result["total"]
+            problem["timeouts"] += result["timed_out"]
+            tests = problem["tests"]
+            for index, passed in enumerate(result["tests"]):
+                if index == len(tests):
+                    tests.append([0, 0])
+                tests[index][0] += 1
+                tests[index][1] += passed
+
+        tab_switches = event["tab_switch_count"]
+        for label, lowest, highest in TAB_SWITCH_RANGES:
+            if tab_switches >= lowest and (highest is None or tab_switches <= highest):
+                self.tab_switches[label] += 1
+                break
+        self.tab_switch_total += tab_switches
+        self.violations += event["violation_flag"]
+
+    def snapshot(self, exam=None) -> dict:
+        """The aggregates as served to dashboards; exam (the current version) names the Python tests"""
+        count = self.submissions
+        problems = exam.python_problems if exam is not None else {}
+        return {
+            "exam_id": self.exam_id,
+            "submissions": count,
+            "versions": dict(self.versions),
+            "last_submission_at": self.last_submission_at,
+            "scores": {
+                "mean": {section: _ratio(total, count) for section, total in self.score_sums.items()},
+                "min": self.min_total,
+                "max": self.max_total,
+                "distribution": [
+                    {"range": f"{bucket * 100 // SCORE_BUCKETS}-{(bucket + 1) * 100 // SCORE_BUCKETS}%",
+                     "count": bucket_count}
+                    for bucket, bucket_count in enumerate(self.distribution)
+                ],
+            },
+            "mcq": {
+                q_id: {"answered": answered, "correct": correct, "accuracy": _ratio(correct, answered)}
+                for q_id, (answered, correct) in sorted(self.mcq.items())
+            },
+            "sql": {
+                q_id: {"answered": answered, "correct": correct, "accuracy": _ratio(correct, answered)}
+                for q_id, (answered, correct) in sorted(self.sql.items())
+            },
+            "python": {
+                problem_id: {
+                    "submitted": problem["submitted"],
+                    "mean_points": _ratio(problem["points"], problem["submitted"]),
+                    "pass_rate": _ratio(problem["passed"], problem["total"]),
+                    "timeouts": problem["timeouts"],
+                    "tests": [
+                        {
+                            "name": self._test_name(problems.get(problem_id), index),
+                            "runs": runs,
+                            "passed": passed,
+                            "pass_rate": _ratio(passed, runs),
+                        }
+                        for index, (runs, passed) in enumerate(problem["tests"])
+                    ],
+                }
+                for problem_id, problem in self.python.items()
+            },
+            "violations": {
+                "flagged": self.violations,
+                "flagged_rate": _ratio(self.violations, count),
+                "mean_tab_switches": _ratio(self.tab_switch_total, count),
+                "tab_switches": {label: self.tab_switches[label] for label, _, _ in TAB_SWITCH_RANGES},
+            },
+        }
+
+    @staticmethod
+    def _test_name(problem, index: int) -> str:
+        if problem is not None and index < len(problem.tests):
+            return problem.tests[index].get("name", f"Test {index + 1}")
+        return f"Test {index + 1}"
+
+
+class CohortAnalytics:
+    """Per-exam aggregates, updated per graded submission and rebuildable from MySQL"""
+
+    def __init__(self, question_bank, pool, recent_events: int = 10000, batch_size: int = 500):
+        self.question_bank = question_bank
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.recent_events = recent_events
+        self._exams: Dict[str, ExamAggregate] = {}
+        self._recent: "OrderedDict[str, dict]" = OrderedDict()  # submission ID -> event
+        self._counted: set = set()  # IDs of every submission in the aggregates
+        self._rebuild_lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.duplicates = 0
+        self.rebuilds = 0
+        self.last_rebuild: Optional[dict] = None
+
+    def event(self, record: dict) -> dict:
+        """Reduce a graded submission to what the aggregates need"""
+        answers = record.get("answers") or {}
+        try:
+            exam = self.question_bank.get(record["exam_id"])
+            mcq = exam.mcq_correct({int(q_id): answer for q_id, answer in (answers.get("mcq") or {}).items()})
+            sql = exam.sql_correct({int(q_id): answer for q_id, answer in (answers.get("sql") or {}).items()})
+        except KeyError:
+            mcq, sql = {}, {}  # exam no longer defined: scores still count
+        test_outcomes = record.get("python_test_outcomes") or {}
+        return {
+            "id": record["id"],
+            "exam_id": record["exam_id"],
+            "exam_version": str(record["exam_version"]),
+            "timestamp": record["timestamp"],
+            "scores": {
+                "mcq": record["mcq_score"],
+                "sql": record["sql_score"],
+                "python": record["python_score"],
+                "total": record["total_score"],
+            },
+            "max_score": record["max_score"],
+            "mcq": mcq,
+            "sql": sql,
+            "python": {
+                problem_id: {
+                    "points": float(result["points"]),
+                    "passed": result["passed"],
+                    "total": result["total"],
+                    "timed_out": bool(result.get("timed_out")),
+                    "tests": [bool(passed) for passed in test_outcomes.get(problem_id, ())],
+                }
+                for problem_id, result in (record.get("python_results") or {}).items()
+            },
+            "tab_switch_count": record.get("tab_switch_count") or 0,
+            "violation_flag": bool(record.get("violation_flag")),
+        }
+
+    def record(self, record: dict):
+        """Count a freshly graded submission"""
+        if record["id"] in self._counted:
+            self.duplicates += 1
+            return
+        event = self.event(record)
+        self._counted.add(event["id"])
+        self._remember(event)
+        self._aggregate(self._exams, event["exam_id"]).add(event)
+        self.recorded += 1
+
+    def _remember(self, event: dict):
+        self._recent[event["id"]] = event
+        while len(self._recent) > self.recent_events:
+            self._recent.popitem(last=False)
+
+    @staticmethod
+    def _aggregate(exams: Dict[str, ExamAggregate], exam_id: str) -> ExamAggregate:
+        aggregate = exams.get(exam_id)
+        if aggregate is None:
+            aggregate = exams[exam_id] = ExamAggregate(exam_id)
+        return aggregate
+
+    async def rebuild(self) -> dict:
+        """Recompute every aggregate from the submissions tables, then swap them in"""
+        async with self._rebuild_lock:
+            started = time.perf_counter()
+            exams: Dict[str, ExamAggregate] = {}
+            loaded = set()
+            after_id = ""
+            while True:
+                records = await self.pool.run(load_submissions, after_id, self.batch_size)
+                if not records:
+                    break
+                for record in records:
+                    event = self.event(record)
+                    self._aggregate(exams, event["exam_id"]).add(event)
+                    loaded.add(event["id"])
+                after_id = records[-1]["id"]
+                await asyncio.sleep(0)  # let requests in between batches
+
+            # Recent submissions not in MySQL yet (write-behind queue, spill file, graded meanwhile)
+            pending = [event for submission_id, event in self._recent.items() if submission_id not in loaded]
+            for event in pending:
+                self._aggregate(exams, event["exam_id"]).add(event)
+            self._exams = exams
+            self._counted = loaded.union(self._recent)
+
+            self.rebuilds += 1
+            self.last_rebuild = {
+                "at": time.time(),
+                "seconds": round(time.perf_counter() - started, 3),
+                "loaded": len(loaded),
+                "pending": len(pending),
+            }
+            log.info("Rebuilt cohort analytics from %d stored and %d pending submission(s)", len(loaded),
+                     len(pending), extra={"event": "analytics.rebuilt", **self.last_rebuild})
+            return self.last_rebuild
+
+    async def start(self, rebuild: bool = True):
+        if rebuild:
+            self._rebuild_task = asyncio.create_task(self._rebuild_quietly())
+
+    async def stop(self):
+        if self._rebuild_task:
+            self._rebuild_task.cancel()
+            self._rebuild_task = None
+
+    async def _rebuild_quietly(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            log.warning("Rebuilding cohort analytics failed - %s; counting new submissions only", e,
+                        extra={"event": "analytics.rebuild_failed"})
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._rebuild_lock.locked()
+
+    def exam_ids(self) -> Dict[str, int]:
+        return {exam_id: aggregate.submissions for exam_id, aggregate in self._exams.items()}
+
+    def snapshot(self, exam_id: str) -> Optional[dict]:
+        aggregate = self._exams.get(exam_id)
+        if aggregate is None:
+            return None
+        try:
+            exam = self.question_bank.get(exam_id)
+        except KeyError:
+            exam = None
+        return aggregate.snapshot(exam)
+
+    def stats(self) -> dict:
+        return {
+            "exams": len(self._exams),
+            "recorded": self.recorded,
+            "duplicates": self.duplicates,
+            "recent_events": len(self._recent),
+            "counted": len(self._counted),
+            "rebuilds": self.rebuilds,
+            "rebuilding": self.rebuilding,
+            "last_rebuild": self.last_rebuild,
+        }
@@ -0,0 +1,222 @@
+"""
+MySQL connection pooling for the backend.
+
+pymysql is a blocking driver, so connects, pings and queries are run in
+worker threads (asyncio.to_thread) and never on the event loop. Each
+MySQLPool keeps a bounded set of connections for one user config; idle
+connections are pinged before reuse once they've been idle for a while.
+The first host that accepts a connection is remembered, so later connects
+don't walk the whole fallback list again.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import pymysql
+
+from metrics import MYSQL_CHECKOUT_FAILURES, MYSQL_CHECKOUT_SECONDS, MYSQL_CONNECT_SECONDS, record_stage, timed
+
+# Hosts to try, in order: Docker service name, localhost, 127.0.0.1
+FALLBACK_HOSTS = [
+    os.getenv('MYSQL_HOST', 'mysql'),  # Docker service name
+    'localhost',                        # Local development
+    '127.0.0.1',                       # Explicit localhost IP
+    'mysql',                           # Fallback to Docker name
+]
+
+# Errors after which a connection can't be trusted and must be discarded
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+log = logging.getLogger(__name__)
+
+# port -> host that last accepted a connection, shared by all pools
+_resolved_hosts: Dict[int, str] = {}
+_resolved_lock = threading.Lock()
+
+
+def connect(config: dict, connect_timeout: int = 5) -> pymysql.connections.Connection:
+    """
+    Open a MySQL connection, trying the remembered host first and then the
+    fallback list. Blocking: call it from a worker thread.
+    """
+    port = config['port']
+    with _resolved_lock:
+        cached = _resolved_hosts.get(port)
+    hosts_to_try = ([cached] if cached else []) + [h for h in dict.fromkeys(FALLBACK_HOSTS) if h != cached]
+
+    last_error = None
+    for host in hosts_to_try:
+        try:
+            log.debug("Attempting MySQL connection to %s:%s as %s", host, port, config['user'],
+                      extra={"event": "mysql.connect", "host": host, "port": port})
+            connection = pymysql.connect(
+                host=host,
+                port=port,
+                user=config['user'],
+                password=config['password'],
+                database=config['database'],
+                cursorclass=pymysql.cursors.DictCursor,
+                connect_timeout=connect_timeout
+            )
+            log.info("MySQL connected to %s:%s as %s", host, port, config['user'],
+                     extra={"event": "mysql.connect", "host": host, "port": port})
+            with _resolved_lock:
+                _resolved_hosts[port] = host
+            return connection
+        except Exception as e:
+            last_error = e
+            log.warning("Failed to connect to %s:%s as %s - %s", host, port, config['user'], e,
+                        extra={"event": "mysql.connect_failed", "host": host, "port": port})
+            if host == cached:
+                with _resolved_lock:
+                    _resolved_hosts.pop(port, None)
+
+    raise pymysql.err.OperationalError(2003, f"All MySQL connection attempts failed. Last error: {last_error}")
+
+
+def kill_query(config: dict, thread_id: int) -> bool:
+    """Interrupt the statement running on another connection (blocking); False if that failed"""
+    try:
+        connection = connect(config)
+    except Exception as e:
+        log.warning("Failed to connect to kill MySQL query on thread %s - %s", thread_id, e,
+                    extra={"event": "mysql.kill_failed"})
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"KILL QUERY {int(thread_id)}")
+        return True
+    except pymysql.Error as e:
+        log.warning("Failed to kill MySQL query on thread %s - %s", thread_id, e,
+                    extra={"event": "mysql.kill_failed"})
+        return False
+    finally:
+        connection.close()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class PoolUnavailable(Exception):
+    """Raised when no connection can be obtained from the pool"""
+
+
+class MySQLPool:
+    def __init__(self, name: str, config: dict, max_size: int, idle_check_seconds: float,
+                 checkout_timeout: float, connect_timeout: int = 5):
+        self.name = name
+        self.config = config
+        self.max_size = max(1, max_size)
+        self.idle_check_seconds = idle_check_seconds
+        self.checkout_timeout = checkout_timeout
+        self.connect_timeout = connect_timeout
+        self._idle: List[tuple] = []  # (connection, returned_at), most recent last
+        self._slots = asyncio.Semaphore(self.max_size)
+
+        self.in_use = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.checkout_waits = 0
+
+    async def _checkout(self):
+        while self._idle:
+            connection, returned_at = self._idle.pop()
+            if time.monotonic() - returned_at < self.idle_check_seconds:
+                return connection
+            try:
+                await asyncio.to_thread(connection.ping, False)
+                return connection
+            except Exception:
+                self.discarded += 1
+                _close_quietly(connection)
+
+        with timed(MYSQL_CONNECT_SECONDS, pool=self.name):
+            connection = await asyncio.to_thread(connect, self.config, self.connect_timeout)
+        self.created += 1
+        return connection
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Check out a connection for the duration of the block. Connections that
+        raise a connection-level error are discarded instead of returned.
+        """
+        if self._slots.locked():
+            self.checkout_waits += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.checkout_timeout)
+        except asyncio.TimeoutError:
+            MYSQL_CHECKOUT_FAILURES.labels(self.name).inc()
+            raise PoolUnavailable(f"No free MySQL connection in pool '{self.name}'")
+
+        try:
+            try:
+                connection = await self._checkout()
+            except Exception as e:
+                MYSQL_CHECKOUT_FAILURES.labels(self.name).inc()
+                raise PoolUnavailable(str(e))
+            finally:
+                waited = time.perf_counter() - started
+                MYSQL_CHECKOUT_SECONDS.labels(self.name).observe(waited)
+                record_stage("mysql_checkout", waited)
+
+            self.checkouts += 1
+            self.in_use += 1
+            healthy = True
+            try:
+                yield connection
+            except (asyncio.CancelledError, GeneratorExit, *CONNECTION_ERRORS):
+                # Broken, or abandoned mid-query (possibly with a worker thread
+                # or unread rows still on it): closing also aborts that query
+                healthy = False
+                raise
+            finally:
+                self.in_use -= 1
+                if healthy and connection.open:
+                    self._idle.append((connection, time.monotonic()))
+                else:
+                    self.discarded += 1
+                    _close_quietly(connection)
+        finally:
+            self._slots.release()
+
+    async def run(self, fn, *args):
+        """Run a blocking fn(connection, *args) on a pooled connection in a worker thread"""
+        async with self.connection() as connection:
+            return await asyncio.to_thread(fn, connection, *args)
+
+    async def ping(self) -> bool:
+        try:
+            async with self.connection() as connection:
+                await asyncio.to_thread(connection.ping, False)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            await asyncio.to_thread(_close_quietly, connection)
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+            "created": self.created,
+            "discarded": self.discarded,
+            "checkouts": self.checkouts,
+            "checkout_waits": self.checkout_waits,
+            "resolved_host": _resolved_hosts.get(self.config['port']),
+        }
@@ -0,0 +1,183 @@
+"""
+Embedded, in-process SQL engine for the mystery round.
+
+The mystery dataset in init.sql is a handful of tiny static tables, so instead
+of a network round trip to MySQL per candidate query it can be served from an
+in-memory SQLite copy. The fixture is loaded once per worker process into a
+serialized image; each thread gets its own read-only connection deserialized
+from that image. MySQL-isms that matter for candidate queries are smoothed
+over: text columns compare case-insensitively like MySQL's default
+collation, and a few common MySQL string functions are registered.
+"""
+
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, List
+
+from sql_runner import ER_QUERY_TIMEOUT, FETCH_BATCH, QueryGuard, QueryTimeout, ResultCap
+
+# Statements in init.sql that only make sense on a MySQL server
+_SKIPPED_STATEMENTS = re.compile(r"^\s*(CREATE\s+DATABASE|USE|CREATE\s+USER|GRANT|FLUSH)\b", re.IGNORECASE)
+
+# sqlite3 authorizer actions a read-only candidate query may perform
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+# Check the deadline every N SQLite VM instructions
+_PROGRESS_INTERVAL = 10000
+
+# Canonical queries for the five mystery questions, and how to read the answer off their rows
+MYSTERY_QUERIES: Dict[int, tuple] = {
+    1: ("SELECT access_time FROM security_logs WHERE date = '2024-01-15' AND access_time >= '22:00' "
+        "ORDER BY access_time LIMIT 1",
+        lambda rows: rows[0]["access_time"] if rows else None),
+    2: ("SELECT e.name FROM employees e JOIN security_logs s ON e.user_id = s.user_id "
+        "WHERE s.date = '2024-01-15' AND s.access_time = '23:45'",
+        lambda rows: rows[0]["name"] if rows else None),
+    3: ("SELECT table_name FROM access_history WHERE user_id = 103 AND date = '2024-01-15' ORDER BY table_name",
+        lambda rows: ", ".join(row["table_name"] for row in rows)),
+    4: ("SELECT status FROM employee_records WHERE user_id = 103",
+        lambda rows: "Yes" if rows and rows[0]["status"] == "terminated" else "No"),
+    5: ("SELECT destination_ip FROM network_traffic WHERE user_id = 103 ORDER BY data_size_mb DESC LIMIT 1",
+        lambda rows: rows[0]["destination_ip"] if rows else None),
+}
+
+
+def _mysql_concat(*args):
+    return None if any(a is None for a in args) else "".join(str(a) for a in args)
+
+
+def _mysql_concat_ws(separator, *args):
+    return None if separator is None else str(separator).join(str(a) for a in args if a is not None)
+
+
+MYSQL_FUNCTIONS = {
+    ("concat", -1): _mysql_concat,
+    ("concat_ws", -1): _mysql_concat_ws,
+    ("lcase", 1): lambda s: None if s is None else str(s).lower(),
+    ("ucase", 1): lambda s: None if s is None else str(s).upper(),
+    ("left", 2): lambda s, n: None if s is None else str(s)[:max(0, n)],
+    ("right", 2): lambda s, n: None if s is None else (str(s)[-n:] if n > 0 else ""),
+}
+
+
+def fixture_statements(sql: str) -> List[str]:
+    """Split a MySQL dump into SQLite-compatible statements"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    statements = []
+    for statement in "\n".join(lines).split(";"):
+        if not statement.strip() or _SKIPPED_STATEMENTS.match(statement):
+            continue
+        # MySQL's default collation compares text case-insensitively
+        statement = re.sub(r"\bVARCHAR\s*\(\s*\d+\s*\)", "TEXT COLLATE NOCASE", statement, flags=re.IGNORECASE)
+        statements.append(statement)
+    return statements
+
+
+def build_image(fixture_path: str) -> bytes:
+    """Load the fixture into a fresh in-memory database and serialize it"""
+    with open(fixture_path) as f:
+        statements = fixture_statements(f.read())
+    connection = sqlite3.connect(":memory:")
+    try:
+        for statement in statements:
+            connection.execute(statement)
+        connection.commit()
+        return connection.serialize()
+    finally:
+        connection.close()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _read_only(action, *args):
+    return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+class EmbeddedSQLEngine:
+    """Read-only SQLite snapshot of the fixture, with one connection per thread"""
+
+    name = "embedded"
+
+    def __init__(self, fixture_path: str):
+        started = time.perf_counter()
+        self.fixture_path = fixture_path
+        self._image = build_image(fixture_path)
+        self._local = threading.local()
+        self.load_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.queries = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(":memory:", check_same_thread=False)
+            connection.deserialize(self._image)
+            connection.execute("PRAGMA query_only = ON")
+            for (name, arity), fn in MYSQL_FUNCTIONS.items():
+                connection.create_function(name, arity, fn, deterministic=True)
+            connection.set_authorizer(_read_only)
+            connection.row_factory = _dict_row
+            self._local.connection = connection
+        return connection
+
+    def _run(self, query: str, max_rows: int, max_bytes: int, deadline: float, timeout: float) -> dict:
+        """Run a query to completion or the cap (blocking, called from a worker thread)"""
+        connection = self._connection()
+        connection.set_progress_handler(lambda: time.monotonic() > deadline, _PROGRESS_INTERVAL)
+        cap = ResultCap(max_rows, max_bytes)
+        rows = []
+        try:
+            cursor = connection.execute(query)
+            while not cap.truncated:
+                batch = cursor.fetchmany(FETCH_BATCH)
+                if not batch:
+                    break
+                rows.extend(cap.take(batch))
+            cursor.close()
+        except sqlite3.OperationalError as e:
+            if str(e) == "interrupted":
+                raise QueryTimeout(ER_QUERY_TIMEOUT, f"Query exceeded the {timeout:g} second time limit")
+            raise
+        finally:
+            connection.set_progress_handler(None, 0)
+        return {"rows": rows, "truncated": cap.truncated}
+
+    async def run_capped(self, query: str, max_rows: int, max_bytes: int, guard: QueryGuard) -> dict:
+        # No EXPLAIN pre-check: SQLite has no row estimates, and the progress
+        # handler deadline already bounds the cost of any query
+        self.queries += 1
+        return await asyncio.to_thread(self._run, query, max_rows, max_bytes, guard.deadline, guard.timeout)
+
+    async def stream_capped(self, query: str, cap: ResultCap, guard: QueryGuard) -> AsyncIterator[List[dict]]:
+        # Results are in memory and capped, so run to completion and replay in batches
+        result = await self.run_capped(query, cap.max_rows, cap.max_bytes, guard)
+        cap.truncated = result["truncated"]
+        rows = result["rows"]
+        for start in range(0, len(rows), FETCH_BATCH):
+            yield rows[start:start + FETCH_BATCH]
+
+    def stats(self) -> dict:
+        return {"engine": self.name, "fixture": self.fixture_path, "load_ms": self.load_ms, "queries": self.queries}
+
+
+async def resolve_mystery_answers(engine, timeout: float = 5) -> Dict[int, str]:
+    """Answer the five mystery questions on an engine using the canonical queries"""
+    answers = {}
+    for question_id, (query, extract) in MYSTERY_QUERIES.items():
+        result = await engine.run_capped(query, 1000, 1024 * 1024, QueryGuard(timeout, None))
+        answers[question_id] = extract(result["rows"])
+    return answers
+
+
+def answer_mismatches(answers: Dict[int, str], expected: Dict[int, str],
+                      normalize: Callable[[str], str] = lambda s: (s or "").lower().strip()) -> Dict[int, tuple]:
+    """Questions where an engine's answer differs from the expected one: {id: (got, expected)}"""
+    return {
+        question_id: (answers.get(question_id), expected_answer)
+        for question_id, expected_answer in expected.items()
+        if normalize(answers.get(question_id)) != normalize(expected_answer)
+    }
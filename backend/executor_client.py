@@ -0,0 +1,276 @@
+"""
+Shared HTTP client for calls from the backend to the Python executors.
+
+One keep-alive connection pool per executor instance is created at startup
+and reused by every route, instead of opening a new httpx.AsyncClient (and
+TCP connection) per request. Requests are traced through httpcore so we can
+report how often connections are reused and how long requests wait for a
+free connection. The current request ID is passed on in X-Request-Id.
+
+With several executor instances, each request goes to the healthy instance
+with the fewest requests in flight. An instance is ejected after repeated
+failures (or a failed /health probe) and re-admitted once /health answers
+again. Idempotent requests (test runs) that fail to reach an instance, or
+that it refuses as overloaded, are retried on another one.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from typing import List, Optional
+
+import httpx
+
+from logs import REQUEST_ID_HEADER, current_request_id
+from metrics import (
+    EXECUTOR_FAILURES, EXECUTOR_INSTANCE_HEALTHY, EXECUTOR_OUTSTANDING, EXECUTOR_REQUEST_SECONDS, timed,
+)
+
+log = logging.getLogger(__name__)
+
+# Responses that mean "this instance can't take it right now", worth retrying elsewhere
+RETRYABLE_STATUSES = {502, 503, 504}
+
+
+class ExecutorUnavailable(httpx.RequestError):
+    """Raised when no executor instance could be reached"""
+
+
+class ExecutorInstance:
+    """One executor endpoint: its connection pool, load and health"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.client: Optional[httpx.AsyncClient] = None
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.probe_ms: Optional[float] = None
+
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def succeeded(self):
+        self.consecutive_failures = 0
+
+    def failed(self, eject_after: int):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.healthy and self.consecutive_failures >= eject_after:
+            self.set_healthy(False, f"{self.consecutive_failures} consecutive failures")
+
+    def set_healthy(self, healthy: bool, reason: str):
+        if healthy == self.healthy:
+            return
+        self.healthy = healthy
+        EXECUTOR_INSTANCE_HEALTHY.labels(self.base_url).set(1 if healthy else 0)
+        if healthy:
+            self.consecutive_failures = 0
+            log.info("Executor %s re-admitted", self.base_url,
+                     extra={"event": "executor.readmitted", "instance": self.base_url})
+        else:
+            self.ejections += 1
+            log.warning("Executor %s ejected: %s", self.base_url, reason,
+                        extra={"event": "executor.ejected", "instance": self.base_url})
+
+    def stats(self) -> dict:
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "probe_ms": self.probe_ms,
+        }
+
+
+class ExecutorClient:
+    def __init__(self, base_urls: List[str], max_connections: int, max_keepalive_connections: int,
+                 keepalive_expiry: float, pool_timeout: float, health_interval: float = 5.0,
+                 eject_after_failures: int = 3):
+        self.instances = [ExecutorInstance(url.rstrip("/")) for url in dict.fromkeys(base_urls)]
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.pool_timeout = pool_timeout
+        self.health_interval = health_interval
+        self.eject_after_failures = max(1, eject_after_failures)
+        self._rotation = itertools.count()
+        self._prober: Optional[asyncio.Task] = None
+        self._started = False
+
+        self.requests = 0
+        self.retries = 0
+        self.new_connections = 0
+        self.active_requests = 0
+        self.pool_waits = 0
+        self.pool_wait_seconds = 0.0
+        self.max_pool_wait_seconds = 0.0
+        self.pool_timeouts = 0
+
+    async def start(self):
+        for instance in self.instances:
+            instance.client = httpx.AsyncClient(
+                base_url=instance.base_url,
+                limits=self.limits,
+                timeout=httpx.Timeout(30.0, pool=self.pool_timeout),
+            )
+            EXECUTOR_INSTANCE_HEALTHY.labels(instance.base_url).set(1 if instance.healthy else 0)
+        self._started = True
+        if self.health_interval > 0:
+            self._prober = asyncio.create_task(self._probe_loop())
+
+    async def close(self):
+        if self._prober:
+            self._prober.cancel()
+            self._prober = None
+        for instance in self.instances:
+            if instance.client is not None:
+                await instance.client.aclose()
+                instance.client = None
+        self._started = False
+
+    async def _probe(self, instance: ExecutorInstance):
+        started = time.perf_counter()
+        try:
+            response = await instance.client.get("/health", timeout=2.0)
+            healthy = response.status_code == 200
+            reason = f"/health returned {response.status_code}"
+        except httpx.HTTPError as e:
+            healthy, reason = False, f"/health failed: {e!r}"
+        instance.probe_ms = round((time.perf_counter() - started) * 1000, 2)
+        instance.set_healthy(healthy, reason)
+
+    async def probe_all(self) -> List[dict]:
+        """Probe every instance's /health now (ejecting or re-admitting it); per-instance stats"""
+        await asyncio.gather(*(self._probe(instance) for instance in self.instances))
+        return [instance.stats() for instance in self.instances]
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.probe_all()
+
+    def pick(self, exclude=()) -> Optional[ExecutorInstance]:
+        """The healthy instance with the fewest requests in flight (ties rotate)"""
+        candidates = [instance for instance in self.instances if instance not in exclude]
+        healthy = [instance for instance in candidates if instance.healthy]
+        # With every instance ejected, trying one beats failing outright
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+        offset = next(self._rotation)
+        return min(
+            (candidates[(offset + i) % len(candidates)] for i in range(len(candidates))),
+            key=lambda instance: instance.outstanding,
+        )
+
+    async def request(self, method: str, path: str, retry: bool = False, **kwargs) -> httpx.Response:
+        """
+        Send a request to the least loaded instance, recording connection metrics.
+        With retry=True (idempotent requests only) a connection failure or an
+        overloaded response moves the request to the next instance.
+        """
+        if not self._started:
+            raise RuntimeError("Executor client used before application startup")
+        request_id = current_request_id()
+        if request_id:
+            kwargs["headers"] = {REQUEST_ID_HEADER: request_id, **(kwargs.get("headers") or {})}
+
+        tried = []
+        while True:
+            instance = self.pick(exclude=tried)
+            if instance is None:
+                raise ExecutorUnavailable(f"No executor instance could take {method} {path}")
+            tried.append(instance)
+            last_attempt = not retry or len(tried) == len(self.instances)
+            try:
+                response = await self._send(instance, method, path, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError):
+                instance.failed(self.eject_after_failures)
+                if last_attempt:
+                    raise
+                self.retries += 1
+                continue
+
+            if response.status_code in RETRYABLE_STATUSES:
+                if response.status_code != 503:
+                    instance.failed(self.eject_after_failures)
+                if not last_attempt:
+                    self.retries += 1
+                    continue
+            else:
+                instance.succeeded()
+            return response
+
+    async def _send(self, instance: ExecutorInstance, method: str, path: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+
+        async def trace(event_name: str, info: dict):
+            nonlocal acquired
+            if acquired:
+                return
+            # The first event after checkout is either a new TCP connect or,
+            # on a reused keep-alive connection, sending the request headers
+            if event_name in ("connection.connect_tcp.started", "http11.send_request_headers.started"):
+                acquired = True
+                waited = time.perf_counter() - started
+                self.pool_wait_seconds += waited
+                self.max_pool_wait_seconds = max(self.max_pool_wait_seconds, waited)
+                if waited > 0.001:
+                    self.pool_waits += 1
+                if event_name == "connection.connect_tcp.started":
+                    self.new_connections += 1
+
+        self.requests += 1
+        self.active_requests += 1
+        instance.requests += 1
+        instance.outstanding += 1
+        EXECUTOR_OUTSTANDING.labels(instance.base_url).inc()
+        try:
+            with timed(EXECUTOR_REQUEST_SECONDS, stage="executor", path=path, instance=instance.base_url):
+                return await instance.client.request(method, path, extensions={"trace": trace}, **kwargs)
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            EXECUTOR_FAILURES.labels(path, "pool_timeout").inc()
+            raise
+        except httpx.TimeoutException:
+            EXECUTOR_FAILURES.labels(path, "timeout").inc()
+            raise
+        except httpx.RequestError:
+            EXECUTOR_FAILURES.labels(path, "connection").inc()
+            raise
+        finally:
+            self.active_requests -= 1
+            instance.outstanding -= 1
+            EXECUTOR_OUTSTANDING.labels(instance.base_url).dec()
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    def stats(self) -> dict:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "active_requests": self.active_requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            "pool_waits": self.pool_waits,
+            "pool_timeouts": self.pool_timeouts,
+            "avg_pool_wait_ms": round(self.pool_wait_seconds / self.requests * 1000, 3) if self.requests else 0.0,
+            "max_pool_wait_ms": round(self.max_pool_wait_seconds * 1000, 3),
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "instances": [instance.stats() for instance in self.instances],
+        }
@@ -0,0 +1,223 @@
+"""
+Asynchronous grading jobs.
+
+Submitting an assessment only records a job and returns its ID; a fixed set
+of worker tasks grade jobs in the background and clients poll for progress
+and the final scores. Jobs are kept in a local SQLite file (WAL mode) rather
+than in memory, so a restart doesn't lose them: anything still queued or
+mid-grading when the process stopped is picked up again on startup.
+Grading is idempotent per submission ID, so re-running a job that was
+interrupted halfway is safe.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from metrics import GRADING_FAILURES, GRADING_SECONDS, SUBMISSION_SECONDS
+
+log = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS grading_jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+"""
+
+# grade(job_id, payload, progress) -> result; progress is a dict the grader updates in place
+Grader = Callable[[str, dict, dict], Awaitable[dict]]
+
+
+class JobStore:
+    """The grading_jobs table; every call is blocking and serialized by a lock"""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def insert(self, job_id: str, payload: dict):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO grading_jobs (id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload), now, now),
+            )
+
+    def claim(self, job_id: str) -> Optional[tuple]:
+        """Mark a job running and return (payload, attempts, created_at)"""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE grading_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id),
+            )
+            row = self._connection.execute(
+                "SELECT payload, attempts, created_at FROM grading_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1], row[2]) if row else None
+
+    def finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE grading_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT status, result, error, attempts, created_at, updated_at FROM grading_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, error, attempts, created_at, updated_at = row
+        return {
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def unfinished(self) -> list:
+        """IDs of jobs still queued or interrupted mid-grading, oldest first"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM grading_jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM grading_jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, older_than)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class GradingQueue:
+    """Durable job queue plus the worker tasks that grade from it"""
+
+    def __init__(self, path: str, workers: int, max_attempts: int, retention_seconds: float, grade: Grader):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.grade = grade
+        self._store: Optional[JobStore] = None
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._progress: Dict[str, dict] = {}  # job_id -> progress of jobs being graded right now
+        self._tasks = []
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+
+    async def start(self):
+        self._store = await asyncio.to_thread(JobStore, self.path)
+        self._pending = asyncio.Queue()
+        pruned = await asyncio.to_thread(self._store.prune, time.time() - self.retention_seconds)
+        unfinished = await asyncio.to_thread(self._store.unfinished)
+        for job_id in unfinished:
+            self._pending.put_nowait(job_id)
+        self.recovered = len(unfinished)
+        if unfinished or pruned:
+            log.info("Grading queue: resumed %d unfinished job(s), pruned %d old job(s)", len(unfinished), pruned,
+                     extra={"event": "grading.recovered"})
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; jobs they were grading stay 'running' and resume on next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store:
+            self._store.close()
+            self._store = None
+
+    async def submit(self, job_id: str, payload: dict):
+        """Record a job durably, then queue it for a worker"""
+        await asyncio.to_thread(self._store.insert, job_id, payload)
+        self.submitted += 1
+        self._pending.put_nowait(job_id)
+
+    async def status(self, job_id: str) -> Optional[dict]:
+        job = await asyncio.to_thread(self._store.get, job_id)
+        if job is None:
+            return None
+        if job["status"] == RUNNING and job_id in self._progress:
+            job["progress"] = dict(self._progress[job_id])
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._pending.get()
+            claimed = await asyncio.to_thread(self._store.claim, job_id)
+            if claimed is None:
+                continue
+            payload, attempts, created_at = claimed
+            if attempts > self.max_attempts:
+                # Crashed the process (or was interrupted) too many times already
+                await asyncio.to_thread(self._store.finish, job_id, FAILED, None,
+                                        f"Gave up after {self.max_attempts} attempts")
+                self.failed += 1
+                GRADING_FAILURES.labels("attempts").inc()
+                continue
+
+            self._progress[job_id] = {}
+            started = time.perf_counter()
+            try:
+                result = await self.grade(job_id, payload, self._progress[job_id])
+                GRADING_SECONDS.observe(time.perf_counter() - started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("Grading job %s failed - %s", job_id, e, exc_info=True,
+                          extra={"event": "grading.failed", "submission_id": job_id})
+                await asyncio.to_thread(self._store.finish, job_id, FAILED, None, str(e))
+                self.failed += 1
+                GRADING_FAILURES.labels("error").inc()
+            else:
+                await asyncio.to_thread(self._store.finish, job_id, DONE, result)
+                self.completed += 1
+                # Submit to scores available, including time queued (and any earlier attempts)
+                SUBMISSION_SECONDS.observe(time.time() - created_at)
+            finally:
+                self._progress.pop(job_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._pending.qsize(),
+            "grading": len(self._progress),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "recovered": self.recovered,
+        }
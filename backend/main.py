@@ -1,27 +1,64 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from typing import Dict, Optional, List
+import asyncio
+import hashlib
 import json
+import logging
+import sqlite3
 import time
 import pymysql
 import os
+import sys
 import httpx
 
-app = FastAPI(title="TechAssess API")
-
-# CORS middleware to allow frontend requests
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your frontend URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Modules shared by both services (logs, health) live in common/, next to the service
+# directories in a checkout and at /common in the images
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from cohort_analytics import CohortAnalytics
+from db import MySQLPool, PoolUnavailable
+from embedded_sql import EmbeddedSQLEngine, answer_mismatches, resolve_mystery_answers
+from executor_client import ExecutorClient
+from grading_jobs import GradingQueue
+from health import DependencyDown, HealthMonitor
+from logs import LogPipeline, current_request_id, request_id_var, track_request_ids
+from metrics import GRADING_TIMEOUTS, SQL_QUERY_FAILURES, SQL_QUERY_SECONDS, metrics_response, timed, track_requests
+from query_cache import QueryCache
+from question_bank import QuestionBank
+from submission_store import SubmissionStore, new_submission_id
+from sql_runner import FETCH_BATCH, MySQLEngine, QueryGuard, QueryRejected, QueryTimeout, ResultCap
+
+# JSON logs written by a background thread (LOG_LEVEL, LOG_SAMPLE_RATES)
+log_pipeline = LogPipeline("backend")
+log = logging.getLogger("techassess")
 
 # Python Executor Service URL
 PYTHON_EXECUTOR_URL = os.getenv('PYTHON_EXECUTOR_URL', 'http://localhost:8001')
 
+# Comma-separated executor instances to balance across (defaults to PYTHON_EXECUTOR_URL)
+PYTHON_EXECUTOR_URLS = [
+    url.strip() for url in os.getenv('PYTHON_EXECUTOR_URLS', PYTHON_EXECUTOR_URL).split(',') if url.strip()
+]
+
+# Shared connection pools to the executors
+executor_client = ExecutorClient(
+    PYTHON_EXECUTOR_URLS,
+    max_connections=int(os.getenv('EXECUTOR_MAX_CONNECTIONS', 100)),
+    max_keepalive_connections=int(os.getenv('EXECUTOR_MAX_KEEPALIVE', 20)),
+    keepalive_expiry=float(os.getenv('EXECUTOR_KEEPALIVE_EXPIRY', 30)),
+    pool_timeout=float(os.getenv('EXECUTOR_POOL_TIMEOUT', 10)),
+    # Seconds between /health probes that eject and re-admit instances
+    health_interval=float(os.getenv('EXECUTOR_HEALTH_INTERVAL', 5)),
+    eject_after_failures=int(os.getenv('EXECUTOR_EJECT_AFTER_FAILURES', 3)),
+)
+
+# Overall time budget for grading all Python problems of a submission
+SUBMIT_GRADING_DEADLINE = float(os.getenv('SUBMIT_GRADING_DEADLINE', 45))
+
 # Development mode flag
 DEV_MODE = os.getenv('DEV_MODE', 'true').lower() == 'true'
 
@@ -41,42 +78,174 @@ CANDIDATE_CONFIG = {
     'database': os.getenv('MYSQL_DATABASE', 'techassess'),
 }
 
-def get_mysql_connection(config=None):
-    """Create and return a MySQL connection with retry logic"""
-    if config is None:
-        config = MYSQL_CONFIG
-
-    # Try multiple hosts: Docker service name, localhost, 127.0.0.1
-    hosts_to_try = [
-        os.getenv('MYSQL_HOST', 'mysql'),  # Docker service name
-        'localhost',                        # Local development
-        '127.0.0.1',                       # Explicit localhost IP
-        'mysql',                           # Fallback to Docker name
-    ]
+# MySQL connection pools, one per user config
+MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 10))
+MYSQL_POOL_IDLE_CHECK = float(os.getenv('MYSQL_POOL_IDLE_CHECK', 30))  # Ping connections idle longer than this
+MYSQL_POOL_CHECKOUT_TIMEOUT = float(os.getenv('MYSQL_POOL_CHECKOUT_TIMEOUT', 10))
+
+mysql_pool = MySQLPool('app', MYSQL_CONFIG, MYSQL_POOL_SIZE, MYSQL_POOL_IDLE_CHECK, MYSQL_POOL_CHECKOUT_TIMEOUT)
+candidate_pool = MySQLPool('candidate', CANDIDATE_CONFIG, MYSQL_POOL_SIZE, MYSQL_POOL_IDLE_CHECK, MYSQL_POOL_CHECKOUT_TIMEOUT)
+
+# Graded submissions live in their own database, out of reach of candidate_user
+RESULTS_CONFIG = {**MYSQL_CONFIG, 'database': os.getenv('SUBMISSIONS_DATABASE', 'techassess_results')}
+results_pool = MySQLPool('results', RESULTS_CONFIG, int(os.getenv('SUBMISSIONS_POOL_SIZE', 2)),
+                         MYSQL_POOL_IDLE_CHECK, MYSQL_POOL_CHECKOUT_TIMEOUT)
+
+# Write-behind persistence of submissions (batched inserts, local spill file while MySQL is down)
+submission_store = SubmissionStore(
+    results_pool,
+    spill_path=os.getenv('SUBMISSION_SPILL_PATH', 'submissions.spill.jsonl'),
+    batch_size=int(os.getenv('SUBMISSION_BATCH_SIZE', 50)),
+    flush_interval=float(os.getenv('SUBMISSION_FLUSH_INTERVAL', 1)),
+    max_queue=int(os.getenv('SUBMISSION_MAX_QUEUE', 10000)),
+    spill_retry_seconds=float(os.getenv('SUBMISSION_SPILL_RETRY', 30)),
+)
 
-    last_error = None
+# Mystery-round dataset loaded into MySQL (and into the embedded engine)
+SQL_FIXTURE = os.getenv('SQL_FIXTURE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'init.sql'))
+
+# Exam definitions (answer keys and hidden tests), recompiled when an exam's version changes
+QUESTION_BANK_DIR = os.getenv('QUESTION_BANK_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exams'))
+question_bank = QuestionBank(
+    QUESTION_BANK_DIR,
+    default_exam=os.getenv('DEFAULT_EXAM', 'default'),
+    reload_seconds=float(os.getenv('QUESTION_BANK_RELOAD_SECONDS', 10)),
+)
+
+# Live per-exam aggregates for recruiter dashboards, rebuilt from the results database at startup
+cohort_analytics = CohortAnalytics(
+    question_bank,
+    results_pool,
+    recent_events=int(os.getenv('ANALYTICS_RECENT_EVENTS', 10000)),
+    batch_size=int(os.getenv('ANALYTICS_REBUILD_BATCH', 500)),
+)
+ANALYTICS_REBUILD_ON_START = os.getenv('ANALYTICS_REBUILD_ON_START', 'true').lower() == 'true'
+
+# Engine serving candidate SQL: "mysql", or "embedded" for an in-process
+# read-only SQLite snapshot of the fixture (no network round trip per query)
+SQL_ENGINE = os.getenv('SQL_ENGINE', 'mysql').lower()
+
+if SQL_ENGINE == 'embedded':
+    sql_engine = EmbeddedSQLEngine(SQL_FIXTURE)
+else:
+    # In dev mode: use root/techuser, in prod: use read-only candidate_user
+    sql_engine = MySQLEngine(mysql_pool if DEV_MODE else candidate_pool)
 
-    for host in hosts_to_try:
-        try:
-            print(f"Attempting MySQL connection to {host}:{config['port']} as {config['user']}...")
-            connection = pymysql.connect(
-                host=host,
-                port=config['port'],
-                user=config['user'],
-                password=config['password'],
-                database=config['database'],
-                cursorclass=pymysql.cursors.DictCursor,
-                connect_timeout=5
-            )
-            print(f"✓ MySQL connected successfully to {host}:{config['port']} as {config['user']}")
-            return connection
-        except Exception as e:
-            last_error = e
-            print(f"✗ Failed to connect to {host}:{config['port']} as {config['user']} - {e}")
-            continue
 
-    print(f"✗ All MySQL connection attempts failed. Last error: {last_error}")
-    return None
+def default_dataset_version() -> str:
+    """Hash of the fixture in init.sql, so editing the dataset invalidates cached results"""
+    try:
+        with open(SQL_FIXTURE, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return 'static'
+
+
+# Hard caps on what a single candidate query may return
+SQL_MAX_ROWS = int(os.getenv('SQL_MAX_ROWS', 1000))
+SQL_MAX_RESULT_BYTES = int(os.getenv('SQL_MAX_RESULT_KB', 1024)) * 1024
+
+# Per-query time budget, and the EXPLAIN row estimate above which a query is rejected (0 disables)
+SQL_QUERY_TIMEOUT = float(os.getenv('SQL_QUERY_TIMEOUT', 5))
+SQL_MAX_ESTIMATED_ROWS = int(os.getenv('SQL_MAX_ESTIMATED_ROWS', 1000000))
+
+# Cache of candidate SELECT results over the read-only mystery dataset
+query_cache = QueryCache(
+    dataset_version=os.getenv('SQL_DATASET_VERSION') or default_dataset_version(),
+    max_bytes=int(os.getenv('SQL_CACHE_MAX_MB', 32)) * 1024 * 1024,
+    max_entry_bytes=int(os.getenv('SQL_CACHE_MAX_ENTRY_KB', 512)) * 1024,
+    ttl_seconds=float(os.getenv('SQL_CACHE_TTL', 3600)),
+)
+
+
+# Background grading of submitted assessments (jobs survive restarts in a local SQLite file)
+grading_queue = GradingQueue(
+    path=os.getenv('GRADING_QUEUE_PATH', 'grading_jobs.db'),
+    workers=int(os.getenv('GRADING_WORKERS', 4)),
+    max_attempts=int(os.getenv('GRADING_MAX_ATTEMPTS', 3)),
+    retention_seconds=float(os.getenv('GRADING_JOB_RETENTION_HOURS', 72)) * 3600,
+    grade=lambda job_id, payload, progress: grade_submission(job_id, payload, progress),
+)
+
+
+async def check_mysql() -> dict:
+    if not await mysql_pool.ping():
+        raise DependencyDown("MySQL ping failed")
+    return {"host": mysql_pool.stats()["resolved_host"]}
+
+
+async def check_executor() -> dict:
+    # The client already probes every instance's /health on its own interval; read
+    # its view rather than probing again (only probe here when its prober is off,
+    # or hasn't run yet at startup)
+    stats = executor_client.stats()["instances"]
+    if executor_client.health_interval <= 0 or any(instance["probe_ms"] is None for instance in stats):
+        stats = await executor_client.probe_all()
+    instances = [
+        {"url": instance["url"], "healthy": instance["healthy"], "probe_ms": instance["probe_ms"]}
+        for instance in stats
+    ]
+    if not any(instance["healthy"] for instance in instances):
+        raise DependencyDown("No executor instance answers /health", {"instances": instances})
+    return {"instances": instances}
+
+
+# Dependencies checked in the background and served from a snapshot on /health.
+# None is critical: without MySQL submissions spill to disk, without the executor grading waits.
+health_monitor = HealthMonitor({"mysql": check_mysql, "python_executor": check_executor})
+
+
+async def check_embedded_answers():
+    """Make sure the embedded engine resolves the mystery questions to the expected answers"""
+    mismatches = answer_mismatches(await resolve_mystery_answers(sql_engine), question_bank.get().sql_answers())
+    if mismatches:
+        for question_id, (got, expected) in mismatches.items():
+            log.error("Embedded SQL engine answers question %s with %r, expected %r", question_id, got, expected,
+                      extra={"event": "sql.embedded_mismatch"})
+    else:
+        log.info("Embedded SQL engine loaded %s in %s ms; mystery answers match", SQL_FIXTURE, sql_engine.load_ms,
+                 extra={"event": "sql.embedded_ready"})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_pipeline.start()
+    await executor_client.start()
+    await health_monitor.start()
+    await question_bank.start()
+    await submission_store.start()
+    await cohort_analytics.start(rebuild=ANALYTICS_REBUILD_ON_START)
+    await grading_queue.start()
+    if SQL_ENGINE == 'embedded':
+        await check_embedded_answers()
+    yield
+    await grading_queue.stop()
+    await cohort_analytics.stop()
+    await question_bank.stop()
+    await submission_store.stop()
+    await health_monitor.stop()
+    await executor_client.close()
+    await mysql_pool.close()
+    await candidate_pool.close()
+    await results_pool.close()
+    log_pipeline.stop()
+
+
+app = FastAPI(title="TechAssess API", lifespan=lifespan)
+
+# CORS middleware to allow frontend requests
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # In production, specify your frontend URL
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Request latency and the per-stage Server-Timing header
+app.middleware("http")(track_requests)
+# Request IDs (outermost, so everything below logs under the request's ID)
+app.middleware("http")(track_request_ids)
 
 
 # Request models
@@ -87,6 +256,7 @@ class PythonCodeRequest(BaseModel):
 
 class SQLQueryRequest(BaseModel):
     query: str
+    stream: bool = False  # Return rows as NDJSON while they arrive
 
 
 class AssessmentSubmission(BaseModel):
@@ -96,6 +266,7 @@ class AssessmentSubmission(BaseModel):
     candidate_name: Optional[str] = None
     candidate_email: Optional[str] = None
     tab_switch_count: Optional[int] = 0
+    exam_id: Optional[str] = None  # Defaults to DEFAULT_EXAM
 
 
 # Root endpoint
@@ -115,56 +286,68 @@ async def root():
 # Health check
 @app.get("/health")
 async def health_check():
-    # Check MySQL connection
-    mysql_status = "disconnected"
-    try:
-        conn = get_mysql_connection()
-        if conn:
-            conn.close()
-            mysql_status = "connected"
-    except:
-        pass
-
-    # Check Python Executor
-    executor_status = "disconnected"
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{PYTHON_EXECUTOR_URL}/health", timeout=2.0)
-            if response.status_code == 200:
-                executor_status = "connected"
-    except:
-        pass
+    """Latest snapshot from the background health checks; does no I/O itself"""
+    return {
+        **health_monitor.snapshot(),
+        "mysql": "connected" if health_monitor.is_up("mysql") else "disconnected",
+        "python_executor": "connected" if health_monitor.is_up("python_executor") else "disconnected"
+    }
 
+
+# Prometheus metrics
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+# Runtime statistics for shared resources
+@app.get("/api/stats")
+async def stats():
     return {
-        "status": "healthy",
-        "mysql": mysql_status,
-        "python_executor": executor_status
+        "executor_client": executor_client.stats(),
+        "mysql_pools": {
+            "app": mysql_pool.stats(),
+            "candidate": candidate_pool.stats(),
+            "results": results_pool.stats()
+        },
+        "question_bank": question_bank.stats(),
+        "grading_queue": grading_queue.stats(),
+        "submission_store": submission_store.stats(),
+        "cohort_analytics": cohort_analytics.stats(),
+        "sql_engine": sql_engine.stats(),
+        "logging": log_pipeline.stats(),
+        "sql_cache": query_cache.stats()
     }
 
 
 # Execute Python code via executor service
 @app.post("/api/execute-python")
-async def execute_python(request: PythonCodeRequest):
+async def execute_python(request: PythonCodeRequest, http_request: Request):
     try:
         # Call the Python executor service
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{PYTHON_EXECUTOR_URL}/execute",
-                json={
-                    "code": request.code,
-                    "test_cases": request.test_cases
-                },
-                timeout=30.0  # 30 second timeout for code execution
+        # Test runs are idempotent, so a failed instance hands them to another
+        response = await executor_client.post(
+            "/execute",
+            retry=True,
+            json={
+                "code": request.code,
+                "test_cases": request.test_cases
+            },
+            # Lets the executor share its queue fairly between candidates
+            headers={"X-Client-Id": http_request.headers.get("X-Client-Id") or (
+                http_request.client.host if http_request.client else "anonymous"
+            )},
+            timeout=30.0  # 30 second timeout for code execution
+        )
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Executor service error: {response.text}"
             )
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Executor service error: {response.text}"
-                )
-
     except httpx.TimeoutException:
         return {
             "success": False,
@@ -188,222 +371,392 @@ async def execute_python(request: PythonCodeRequest):
         }
 
 
-# Submit full assessment
-@app.post("/api/submit-assessment")
-async def submit_assessment(submission: AssessmentSubmission):
+async def grade_python_problem(problem_id: str, code: str, test_cases: List[dict], client_id: str,
+                               max_points: float = 5.0) -> dict:
+    """Run one problem's test cases on the executor and score it"""
+    passed_count = 0
+    test_outcomes = []  # pass/fail per test, when the tests ran
     try:
-        # MCQ Scoring
-        mcq_answers = {
-            1: 1, 2: 1, 3: 0, 4: 2, 5: 2,
-            6: 1, 7: 1, 8: 1, 9: 2, 10: 2
-        }
+        # Execute code with test cases via executor service
+        response = await executor_client.post(
+            "/execute",
+            retry=True,
+            json={"code": code, "test_cases": test_cases},
+            headers={"X-Client-Id": client_id},
+            timeout=30.0
+        )
+
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("test_mode"):
+                test_results = result.get("test_results", [])
+                passed_count = sum(1 for tr in test_results if tr.get("passed"))
+                test_outcomes = [bool(tr.get("passed")) for tr in test_results]
+        else:
+            log.warning("Executor returned status %s for %s: %s", response.status_code, problem_id, response.text,
+                        extra={"event": "grading.executor_error", "problem_id": problem_id})
+    except Exception as e:
+        log.warning("Error executing %s: %s", problem_id, e,
+                    extra={"event": "grading.executor_error", "problem_id": problem_id})
+        passed_count = 0
 
-        mcq_score = sum(1 for q_id, answer in submission.mcq.items()
-                       if mcq_answers.get(q_id) == answer)
+    # Calculate points: the problem's points, distributed across test cases
+    total_tests = len(test_cases)
+    points_per_test = max_points / total_tests if total_tests > 0 else 0
+    problem_points = round(passed_count * points_per_test, 2)
 
-        # SQL Scoring
-        sql_answers = {
-            1: "23:45",
-            2: "Charlie Davis",
-            3: "customers, financial_records, salary_data",
-            4: "Yes",
-            5: "185.220.101.45"
-        }
+    return {
+        "passed": passed_count,
+        "total": total_tests,
+        "points": problem_points,
+        "tests": test_outcomes
+    }
 
-        sql_score = 0
-        for q_id, answer in submission.sql.items():
-            user_ans = answer.lower().strip()
-            correct_ans = sql_answers.get(q_id, "").lower().strip()
-
-            if user_ans == correct_ans:
-                sql_score += 1
-            elif q_id == 3:  # Special case for comma-separated values
-                tables = ['customers', 'financial_records', 'salary_data']
-                if all(t in user_ans for t in tables):
-                    sql_score += 1
-
-        # Python Scoring - Execute code with test cases
-        # Problem 1: Two Sum - expects a function twoSum(nums, target)
-        problem1_tests = [
-            {"name": "Test 1", "test": "print(twoSum([2, 7, 11, 15], 9))", "expected": "[0, 1]", "visible": False},
-            {"name": "Test 2", "test": "print(twoSum([3, 2, 4], 6))", "expected": "[1, 2]", "visible": False},
-            {"name": "Test 3", "test": "print(twoSum([3, 3], 6))", "expected": "[0, 1]", "visible": False}
-        ]
-
-        # Problem 2: String Palindrome - expects a function isPalindrome(s)
-        problem2_tests = [
-            {"name": "Test 1", "test": "print(isPalindrome('A man a plan a canal Panama'))", "expected": "True", "visible": False},
-            {"name": "Test 2", "test": "print(isPalindrome('race a car'))", "expected": "False", "visible": False},
-            {"name": "Test 3", "test": "print(isPalindrome('hello'))", "expected": "False", "visible": False}
-        ]
-
-        python_test_cases = {
-            "problem1": problem1_tests,
-            "problem2": problem2_tests
-        }
 
-        python_score = 0
-        python_max_score = 10  # 2 problems × 5 points each
-        python_results = {}
-
-        for problem_id, code in submission.python.items():
-            if not code or not code.strip():
-                python_results[problem_id] = {"passed": 0, "total": 0, "points": 0}
-                continue
-
-            test_cases = python_test_cases.get(problem_id, [])
-            if not test_cases:
-                continue
-
-            passed_count = 0
-            try:
-                # Execute code with test cases via executor service
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"{PYTHON_EXECUTOR_URL}/execute",
-                        json={"code": code, "test_cases": test_cases},
-                        timeout=30.0
-                    )
-
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result.get("test_mode"):
-                            test_results = result.get("test_results", [])
-                            passed_count = sum(1 for tr in test_results if tr.get("passed"))
-                    else:
-                        print(f"✗ Executor returned status {response.status_code}: {response.text}")
-            except Exception as e:
-                print(f"✗ Error executing {problem_id}: {str(e)}")
-                passed_count = 0
-
-            # Calculate points: 5 points per problem, distributed across test cases
-            total_tests = len(test_cases)
-            points_per_test = 5.0 / total_tests if total_tests > 0 else 0
-            problem_points = round(passed_count * points_per_test, 2)
-            python_score += problem_points
-
-            python_results[problem_id] = {
-                "passed": passed_count,
-                "total": total_tests,
-                "points": problem_points
-            }
-
-        python_score = round(python_score)  # Round to nearest integer
-
-        # Store submission (in production, save to database)
-        submission_data = {
-            "candidate_name": submission.candidate_name,
-            "candidate_email": submission.candidate_email,
-            "mcq_score": mcq_score,
-            "sql_score": sql_score,
-            "python_score": python_score,
-            "python_results": python_results,
-            "python_code": submission.python,
-            "total_score": mcq_score + sql_score + python_score,
-            "max_score": 25,  # MCQ(10) + SQL(5) + Python(10)
-            "tab_switch_count": submission.tab_switch_count,
-            "violation_flag": submission.tab_switch_count > 5,  # Flag if more than 5 switches
-            "timestamp": time.time()
-        }
+async def grade_submission(submission_id: str, payload: dict, progress: dict) -> dict:
+    """Grade a queued submission (runs on a grading worker) and hand it to the submission store"""
+    # Log and call the executor under the ID of the request that submitted it
+    token = request_id_var.set(payload.get("request_id") or submission_id)
+    try:
+        return await _grade_submission(submission_id, payload, progress)
+    finally:
+        request_id_var.reset(token)
 
-        # In production, save to database here
-        print(f"\n{'='*50}")
-        print(f"SUBMISSION RECEIVED")
-        print(f"{'='*50}")
-        print(f"Candidate: {submission.candidate_name or 'Anonymous'}")
-        print(f"Email: {submission.candidate_email or 'N/A'}")
-        print(f"MCQ Score: {mcq_score}/10")
-        print(f"SQL Score: {sql_score}/5")
-        print(f"Python Score: {python_score}/10")
-        for prob_id, result in python_results.items():
-            print(f"  {prob_id}: {result['passed']}/{result['total']} tests passed ({result['points']} points)")
-        print(f"Total Score: {mcq_score + sql_score + python_score}/25")
-        print(f"Tab Switches: {submission.tab_switch_count}")
-        if submission.tab_switch_count > 5:
-            print(f"⚠️  WARNING: High number of tab switches detected!")
-        print(f"{'='*50}\n")
+
+async def _grade_submission(submission_id: str, payload: dict, progress: dict) -> dict:
+    submission = AssessmentSubmission(**payload["submission"])
+    client_id = payload["client_id"]
+
+    exam = question_bank.get(submission.exam_id)
+
+    mcq_score = exam.score_mcq(submission.mcq)
+    sql_score = exam.score_sql(submission.sql)
+
+    # Python Scoring - Execute code with the exam's hidden test cases
+    python_score = 0
+    python_results = {}
+    python_test_outcomes = {}  # stored for cohort analytics, not shown to the candidate
+
+    # Grade all problems concurrently under one overall deadline
+    grading_tasks = {}
+    for problem_id, code in submission.python.items():
+        if not code or not code.strip():
+            python_results[problem_id] = {"passed": 0, "total": 0, "points": 0}
+            continue
+
+        problem = exam.python_problems.get(problem_id)
+        if not problem or not problem.tests:
+            continue
+
+        python_results[problem_id] = None  # placeholder keeps submission order
+        grading_tasks[problem_id] = asyncio.create_task(
+            grade_python_problem(problem_id, code, list(problem.tests), client_id, problem.points)
+        )
+
+    progress["python_total"] = len(grading_tasks)
+    progress["python_graded"] = 0
+    for task in grading_tasks.values():
+        task.add_done_callback(lambda _: progress.update(python_graded=progress["python_graded"] + 1))
+
+    pending = set()
+    if grading_tasks:
+        _, pending = await asyncio.wait(grading_tasks.values(), timeout=SUBMIT_GRADING_DEADLINE)
+        for task in pending:
+            task.cancel()
+
+    for problem_id, task in grading_tasks.items():
+        total_tests = len(exam.python_problems[problem_id].tests)
+        if task in pending:
+            # Partial credit: a problem that misses the deadline scores 0, the rest keep theirs
+            log.warning("Grading %s exceeded the %ss deadline", problem_id, SUBMIT_GRADING_DEADLINE,
+                        extra={"event": "grading.timeout", "problem_id": problem_id})
+            GRADING_TIMEOUTS.inc()
+            python_results[problem_id] = {"passed": 0, "total": total_tests, "points": 0, "timed_out": True}
+        else:
+            python_results[problem_id] = task.result()
+            python_test_outcomes[problem_id] = python_results[problem_id].pop("tests")
+        python_score += python_results[problem_id]["points"]
+
+    python_score = round(python_score)  # Round to nearest integer
+
+    # Store submission (written to MySQL in the background)
+    submission_data = {
+        "id": submission_id,
+        "exam_id": exam.exam_id,
+        "exam_version": exam.version,
+        "candidate_name": submission.candidate_name,
+        "candidate_email": submission.candidate_email,
+        "mcq_score": mcq_score,
+        "sql_score": sql_score,
+        "python_score": python_score,
+        "python_results": python_results,
+        "python_test_outcomes": python_test_outcomes,
+        "python_code": submission.python,
+        "answers": {"mcq": submission.mcq, "sql": submission.sql},
+        "total_score": mcq_score + sql_score + python_score,
+        "max_score": exam.max_score,
+        "tab_switch_count": submission.tab_switch_count,
+        "violation_flag": submission.tab_switch_count > 5,  # Flag if more than 5 switches
+        "timestamp": payload["submitted_at"]
+    }
+
+    submission_store.enqueue(submission_data)
+    cohort_analytics.record(submission_data)
+
+    log.info("Submission %s graded: %s/%s", submission_id, submission_data["total_score"], exam.max_score, extra={
+        "event": "submission.graded",
+        "submission_id": submission_id,
+        "candidate_email": submission.candidate_email,
+        "exam_id": exam.exam_id,
+        "exam_version": exam.version,
+        "scores": {"mcq": mcq_score, "sql": sql_score, "python": python_score},
+        "python_results": python_results,
+        "tab_switch_count": submission.tab_switch_count,
+    })
+    if submission_data["violation_flag"]:
+        log.warning("High number of tab switches (%s) in submission %s", submission.tab_switch_count, submission_id,
+                    extra={"event": "submission.violation", "submission_id": submission_id})
+
+    return {
+        "scores": {
+            "mcq": f"{mcq_score}/{exam.max_mcq}",
+            "sql": f"{sql_score}/{exam.max_sql}",
+            "python": f"{python_score}/{exam.max_python}",
+            "total": f"{mcq_score + sql_score + python_score}/{exam.max_score}"
+        },
+        "exam": {"id": exam.exam_id, "version": exam.version},
+        "python_details": python_results
+    }
+
+
+# Submit full assessment: queue it for grading and return right away
+@app.post("/api/submit-assessment")
+async def submit_assessment(submission: AssessmentSubmission, http_request: Request):
+    try:
+        question_bank.get(submission.exam_id)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown exam: {submission.exam_id}")
+
+    try:
+        submission_id = new_submission_id()
+        client_id = submission.candidate_email or (http_request.client.host if http_request.client else "anonymous")
+        await grading_queue.submit(submission_id, {
+            "submission": submission.model_dump(),
+            "client_id": client_id,
+            "request_id": current_request_id(),
+            "submitted_at": time.time()
+        })
 
         return {
             "success": True,
-            "message": "Assessment submitted successfully",
-            "scores": {
-                "mcq": f"{mcq_score}/10",
-                "sql": f"{sql_score}/5",
-                "python": f"{python_score}/10",
-                "total": f"{mcq_score + sql_score + python_score}/25"
-            },
-            "python_details": python_results,
-            "submission_id": int(time.time())  # Mock ID
+            "message": "Assessment submitted successfully; grading in progress",
+            "submission_id": submission_id,
+            "status": "queued",
+            "status_url": f"/api/submissions/{submission_id}"
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Grading progress and final scores of a submission
+@app.get("/api/submissions/{submission_id}")
+async def submission_status(submission_id: str):
+    job = await grading_queue.status(submission_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    response = {
+        "submission_id": submission_id,
+        "status": job["status"],
+        "progress": job.get("progress")
+    }
+    if job["status"] == "done":
+        response.update(job["result"])
+    elif job["status"] == "failed":
+        response["error"] = job["error"]
+    return response
+
+
+# Exams with live analytics and their submission counts
+@app.get("/api/analytics")
+async def analytics_exams():
+    return {"exams": cohort_analytics.exam_ids(), "rebuilding": cohort_analytics.rebuilding}
+
+
+# Cohort aggregates of one exam (served from running counters)
+@app.get("/api/analytics/{exam_id}")
+async def exam_analytics(exam_id: str):
+    snapshot = cohort_analytics.snapshot(exam_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"No submissions for exam: {exam_id}")
+    return snapshot
+
+
+# Recompute all aggregates from stored submissions (e.g. after running regrade.py)
+@app.post("/api/analytics/rebuild")
+async def rebuild_analytics():
+    if cohort_analytics.rebuilding:
+        raise HTTPException(status_code=409, detail="A rebuild is already running")
+    try:
+        return await cohort_analytics.rebuild()
+    except PoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Results database unavailable: {e}")
+
+
 # Legacy endpoint removed - now using /api/execute-python with test_cases
 
 
-# Execute SQL query in MySQL
+def sql_error(message: str) -> dict:
+    return {
+        "success": False,
+        "error": message,
+        "results": [],
+        "row_count": 0
+    }
+
+
+def sql_message(row_count: int, truncated: bool) -> str:
+    if truncated:
+        return f"Query executed successfully. Showing the first {row_count} row(s); the result was truncated."
+    return f"Query executed successfully. {row_count} row(s) returned."
+
+
+def ndjson(event: dict) -> str:
+    return json.dumps(event, default=str) + "\n"
+
+
+def new_query_guard() -> QueryGuard:
+    return QueryGuard(SQL_QUERY_TIMEOUT, SQL_MAX_ESTIMATED_ROWS)
+
+
+def sql_guard_error(e: Exception, guard: QueryGuard) -> dict:
+    """Error body for a query stopped by the time limit or cost guard"""
+    if isinstance(e, QueryTimeout):
+        message = f"Query timeout: {e.args[1]}"
+    else:
+        message = str(e)
+    return {**sql_error(message), "timings": guard.timings()}
+
+
+def count_sql_failure(engine, e: Exception):
+    SQL_QUERY_FAILURES.labels(engine.name, "timeout" if isinstance(e, QueryTimeout) else "rejected").inc()
+
+
+async def stream_sql_events(engine, query: str, cache_key: Optional[str]):
+    """
+    NDJSON body for streamed queries: "rows" events as batches arrive, then a
+    final "end" (or "error") event carrying row_count, truncated and timings.
+    """
+    guard = new_query_guard()
+    cached = query_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        rows = cached["rows"]
+        for start in range(0, len(rows), FETCH_BATCH):
+            yield ndjson({"type": "rows", "rows": rows[start:start + FETCH_BATCH]})
+        truncated = cached["truncated"]
+    else:
+        cap = ResultCap(SQL_MAX_ROWS, SQL_MAX_RESULT_BYTES)
+        # Bounded by the cap, so keeping a copy for the cache doesn't grow unbounded
+        rows = []
+        try:
+            with timed(SQL_QUERY_SECONDS, stage="sql_query", engine=engine.name):
+                async for batch in engine.stream_capped(query, cap, guard):
+                    rows.extend(batch)
+                    yield ndjson({"type": "rows", "rows": batch})
+        except (QueryTimeout, QueryRejected) as e:
+            count_sql_failure(engine, e)
+            yield ndjson({"type": "error", **sql_guard_error(e, guard)})
+            return
+        except PoolUnavailable:
+            SQL_QUERY_FAILURES.labels(engine.name, "unavailable").inc()
+            yield ndjson({"type": "error", **sql_error("MySQL database unavailable")})
+            return
+        except (pymysql.Error, sqlite3.Error) as e:
+            SQL_QUERY_FAILURES.labels(engine.name, "error").inc()
+            yield ndjson({"type": "error", **sql_error(f"SQL Error: {str(e)}")})
+            return
+        except Exception as e:
+            yield ndjson({"type": "error", **sql_error(f"Error: {str(e)}")})
+            return
+        truncated = cap.truncated
+        if cache_key:
+            query_cache.put(cache_key, {"rows": rows, "truncated": truncated})
+
+    yield ndjson({
+        "type": "end",
+        "success": True,
+        "error": None,
+        "row_count": len(rows),
+        "truncated": truncated,
+        "cached": cached is not None,
+        "timings": guard.timings(),
+        "message": sql_message(len(rows), truncated)
+    })
+
+
+# Execute SQL query in MySQL (or the embedded engine)
 @app.post("/api/execute-sql")
 async def execute_sql(request: SQLQueryRequest):
     """
     Execute SQL query in MySQL database and return results
     DEV_MODE: Uses root/techuser with full privileges
     PROD_MODE: Uses candidate_user with SELECT-only privileges
+    SQL_ENGINE=embedded: Uses a read-only in-process SQLite snapshot of init.sql
+    Results are capped at SQL_MAX_ROWS rows / SQL_MAX_RESULT_KB; "truncated" tells the caller.
+    Queries are limited to SQL_QUERY_TIMEOUT seconds and rejected up front if
+    EXPLAIN estimates more than SQL_MAX_ESTIMATED_ROWS rows; stage timings are returned.
+    With stream=true rows are sent as NDJSON events while they arrive.
     """
-    connection = None
+    guard = new_query_guard()
     try:
-        # Get MySQL connection with appropriate user
-        # In dev mode: use root/techuser, in prod: use read-only candidate_user
-        config = MYSQL_CONFIG if DEV_MODE else CANDIDATE_CONFIG
-        connection = get_mysql_connection(config)
-        if not connection:
-            raise HTTPException(status_code=503, detail="MySQL database unavailable")
-
         query = request.query.strip()
 
         # Basic SQL injection protection - only allow SELECT statements
         if not query.lower().startswith('select'):
-            return {
-                "success": False,
-                "error": "Only SELECT queries are allowed for security reasons",
-                "results": [],
-                "row_count": 0
-            }
-
-        # Execute query
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            results = cursor.fetchall()
-            row_count = len(results)
+            return sql_error("Only SELECT queries are allowed for security reasons")
+
+        cache_key = query_cache.key(sql_engine.name, query)
+
+        if request.stream:
+            return StreamingResponse(
+                stream_sql_events(sql_engine, query, cache_key),
+                media_type="application/x-ndjson"
+            )
+
+        result = query_cache.get(cache_key) if cache_key else None
+        cached = result is not None
+        if not cached:
+            with timed(SQL_QUERY_SECONDS, stage="sql_query", engine=sql_engine.name):
+                result = await sql_engine.run_capped(query, SQL_MAX_ROWS, SQL_MAX_RESULT_BYTES, guard)
+            if cache_key:
+                query_cache.put(cache_key, result)
+        row_count = len(result["rows"])
 
         return {
             "success": True,
             "error": None,
-            "results": results,
+            "results": result["rows"],
             "row_count": row_count,
-            "message": f"Query executed successfully. {row_count} row(s) returned."
+            "truncated": result["truncated"],
+            "cached": cached,
+            "timings": guard.timings(),
+            "message": sql_message(row_count, result["truncated"])
         }
 
-    except pymysql.Error as e:
-        return {
-            "success": False,
-            "error": f"SQL Error: {str(e)}",
-            "results": [],
-            "row_count": 0
-        }
+    except (QueryTimeout, QueryRejected) as e:
+        count_sql_failure(sql_engine, e)
+        return sql_guard_error(e, guard)
+    except PoolUnavailable:
+        SQL_QUERY_FAILURES.labels(sql_engine.name, "unavailable").inc()
+        return sql_error("MySQL database unavailable")
+    except (pymysql.Error, sqlite3.Error) as e:
+        SQL_QUERY_FAILURES.labels(sql_engine.name, "error").inc()
+        return sql_error(f"SQL Error: {str(e)}")
     except Exception as e:
-        return {
-            "success": False,
-            "error": f"Error: {str(e)}",
-            "results": [],
-            "row_count": 0
-        }
-    finally:
-        if connection:
-            connection.close()
+        return sql_error(f"Error: {str(e)}")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, access_log=False)
@@ -0,0 +1,122 @@
+"""
+Prometheus metrics for the backend, served on /metrics.
+
+Besides the histograms and counters below, every HTTP request collects the
+time it spent in each stage (MySQL checkout, SQL query, executor call) and
+returns the breakdown in a Server-Timing header, so a single slow request
+can be attributed to a layer without correlating scrapes.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# From sub-millisecond cache hits up to a full grading deadline
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_SECONDS = Histogram(
+    "techassess_http_request_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+MYSQL_CONNECT_SECONDS = Histogram(
+    "techassess_mysql_connect_seconds", "Time to open a new MySQL connection", ["pool"], buckets=LATENCY_BUCKETS,
+)
+MYSQL_CHECKOUT_SECONDS = Histogram(
+    "techassess_mysql_checkout_seconds", "Time to get a connection from a pool (waiting, pinging, connecting)",
+    ["pool"], buckets=LATENCY_BUCKETS,
+)
+MYSQL_CHECKOUT_FAILURES = Counter(
+    "techassess_mysql_checkout_failures_total", "Pool checkouts that found no usable connection", ["pool"],
+)
+SQL_QUERY_SECONDS = Histogram(
+    "techassess_sql_query_seconds", "Candidate SQL run time (cache misses)", ["engine"], buckets=LATENCY_BUCKETS,
+)
+SQL_QUERY_FAILURES = Counter(
+    "techassess_sql_query_failures_total", "Candidate SQL that didn't complete", ["engine", "reason"],
+)
+EXECUTOR_REQUEST_SECONDS = Histogram(
+    "techassess_executor_request_seconds", "Round trip of calls to the Python executor",
+    ["path", "instance"], buckets=LATENCY_BUCKETS,
+)
+EXECUTOR_OUTSTANDING = Gauge(
+    "techassess_executor_outstanding_requests", "Requests in flight per executor instance", ["instance"],
+)
+EXECUTOR_INSTANCE_HEALTHY = Gauge(
+    "techassess_executor_instance_healthy", "1 while an executor instance takes traffic, 0 while ejected", ["instance"],
+)
+EXECUTOR_FAILURES = Counter(
+    "techassess_executor_failures_total", "Calls to the Python executor that failed", ["path", "reason"],
+)
+GRADING_SECONDS = Histogram(
+    "techassess_grading_seconds", "Time to grade a submission once a worker picked it up", buckets=LATENCY_BUCKETS,
+)
+SUBMISSION_SECONDS = Histogram(
+    "techassess_submission_seconds", "End-to-end latency from submit until the scores are available",
+    buckets=LATENCY_BUCKETS,
+)
+GRADING_TIMEOUTS = Counter(
+    "techassess_grading_timeouts_total", "Python problems that missed the grading deadline",
+)
+GRADING_FAILURES = Counter("techassess_grading_failures_total", "Grading jobs that failed", ["reason"])
+SUBMISSION_WRITE_SECONDS = Histogram(
+    "techassess_submission_write_seconds", "Time to write a batch of submissions to MySQL", buckets=LATENCY_BUCKETS,
+)
+SUBMISSIONS_SPILLED = Counter(
+    "techassess_submissions_spilled_total", "Submissions spilled to the local file instead of MySQL", ["reason"],
+)
+
+# Stage -> seconds for the HTTP request being served (None outside a request)
+_request_stages: ContextVar[Optional[dict]] = ContextVar("request_stages", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Add time to a stage of the current request's Server-Timing breakdown"""
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(histogram, stage: Optional[str] = None, **labels):
+    """Observe the duration of the block, and count it towards a request stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        if stage:
+            record_stage(stage, elapsed)
+
+
+def server_timing(stages: dict, total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+
+async def track_requests(request: Request, call_next):
+    """HTTP middleware: request latency by route plus the per-stage Server-Timing header"""
+    stages = {}
+    token = _request_stages.set(stages)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = server_timing(stages, time.perf_counter() - started)
+        return response
+    finally:
+        _request_stages.reset(token)
+        # Route templates rather than raw paths keep label cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
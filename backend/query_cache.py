@@ -0,0 +1,122 @@
+"""
+Result cache for candidate SQL queries.
+
+The mystery-round tables are static fixtures, and candidates run nearly the
+same handful of SELECTs, so results are cached under a normalized form of the
+query. Every key includes the dataset version, so changing the dataset (and
+with it the version) invalidates all cached results at once.
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Functions whose result changes between calls; queries using them aren't cached
+NON_DETERMINISTIC = re.compile(
+    r"\b(now|sysdate|curdate|curtime|current_date|current_time|current_timestamp|"
+    r"localtime|localtimestamp|unix_timestamp|utc_date|utc_time|utc_timestamp|"
+    r"rand|uuid|uuid_short|sleep|benchmark|connection_id|last_insert_id|found_rows|"
+    r"row_count|get_lock|release_lock|user|current_user|session_user|system_user)\s*\(|"
+    r"\b(for\s+update|lock\s+in\s+share\s+mode|into\s+outfile|into\s+dumpfile)\b|@",
+    re.IGNORECASE,
+)
+
+# Quoted strings/identifiers, kept verbatim during normalization
+_QUOTED = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`")
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace outside quoted literals and drop trailing semicolons"""
+    parts = []
+    position = 0
+    for match in _QUOTED.finditer(query):
+        parts.append(re.sub(r"\s+", " ", query[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(re.sub(r"\s+", " ", query[position:]))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_cacheable(query: str) -> bool:
+    # Strip literals first so a string like 'now()' doesn't block caching
+    return not NON_DETERMINISTIC.search(_QUOTED.sub("''", query))
+
+
+class QueryCache:
+    """LRU cache of query results, bounded by total and per-entry size"""
+
+    def __init__(self, dataset_version: str, max_bytes: int, max_entry_bytes: int, ttl_seconds: float):
+        self.dataset_version = dataset_version
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (result, size, expires_at)
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, scope: str, query: str) -> Optional[str]:
+        """Cache key for a query run as `scope` (the DB user), or None if not cacheable"""
+        if not is_cacheable(query):
+            self.skipped += 1
+            return None
+        raw = f"{self.dataset_version}\0{scope}\0{normalize_query(query)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def set_version(self, dataset_version: str):
+        """Switch to a new dataset version, dropping everything cached for the old one"""
+        if dataset_version != self.dataset_version:
+            self.dataset_version = dataset_version
+            self._entries.clear()
+            self.current_bytes = 0
+            self.invalidations += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[2]:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, result: dict):
+        size = len(json.dumps(result, default=str))
+        if size > self.max_entry_bytes:
+            self.skipped += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (result, size, time.monotonic() + self.ttl_seconds)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "dataset_version": self.dataset_version,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
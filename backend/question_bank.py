@@ -0,0 +1,208 @@
+"""
+Exam definitions (question bank).
+
+Each exam is a JSON file in the exams directory holding the MCQ answer key,
+the SQL answers and the hidden Python test cases. Files are compiled once
+into read-only lookup structures: SQL answers are pre-normalized, and
+multi-part answers (like a list of tables) become a set that a response
+matches regardless of order or separators. Grading a submission is then
+just lookups against an already compiled exam.
+
+The directory is re-scanned in the background; an exam whose "version"
+changes is recompiled and swapped in atomically, so submissions already
+being graded finish against the version they started with.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import re
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_ITEM_SEPARATORS = re.compile(r"[,;\s]+")
+
+
+def normalize_answer(answer: str) -> str:
+    return _WHITESPACE.sub(" ", (answer or "").strip().lower())
+
+
+def answer_items(normalized: str) -> frozenset:
+    return frozenset(item for item in _ITEM_SEPARATORS.split(normalized) if item)
+
+
+class SQLAnswerKey(NamedTuple):
+    answer: str
+    normalized: str
+    items: Optional[frozenset]  # set when any ordering/separator of the parts is accepted
+
+    def matches(self, response: str) -> bool:
+        normalized = normalize_answer(response)
+        if normalized == self.normalized:
+            return True
+        return self.items is not None and self.items <= answer_items(normalized)
+
+
+class PythonProblem(NamedTuple):
+    title: str
+    points: float
+    tests: Tuple[dict, ...]
+
+
+class CompiledExam(NamedTuple):
+    exam_id: str
+    version: str
+    title: str
+    mcq_answers: Mapping[int, int]
+    sql_keys: Mapping[int, SQLAnswerKey]
+    python_problems: Mapping[str, PythonProblem]
+
+    @property
+    def max_mcq(self) -> int:
+        return len(self.mcq_answers)
+
+    @property
+    def max_sql(self) -> int:
+        return len(self.sql_keys)
+
+    @property
+    def max_python(self) -> int:
+        return round(sum(problem.points for problem in self.python_problems.values()))
+
+    @property
+    def max_score(self) -> int:
+        return self.max_mcq + self.max_sql + self.max_python
+
+    def score_mcq(self, answers: Mapping[int, int]) -> int:
+        return sum(self.mcq_correct(answers).values())
+
+    def score_sql(self, answers: Mapping[int, str]) -> int:
+        return sum(self.sql_correct(answers).values())
+
+    def mcq_correct(self, answers: Mapping[int, int]) -> Dict[int, bool]:
+        """Per answered question of this exam: whether the answer is right"""
+        return {q_id: self.mcq_answers[q_id] == answer for q_id, answer in answers.items() if q_id in self.mcq_answers}
+
+    def sql_correct(self, answers: Mapping[int, str]) -> Dict[int, bool]:
+        return {q_id: self.sql_keys[q_id].matches(answer) for q_id, answer in answers.items() if q_id in self.sql_keys}
+
+    def sql_answers(self) -> Dict[int, str]:
+        return {q_id: key.answer for q_id, key in self.sql_keys.items()}
+
+
+def compile_exam(definition: dict) -> CompiledExam:
+    """Validate an exam definition and build its lookup structures; raises ValueError"""
+    try:
+        sql_keys = {}
+        for q_id, question in definition.get("sql", {}).items():
+            normalized = normalize_answer(question["answer"])
+            match = question.get("match", "exact")
+            if match not in ("exact", "set"):
+                raise ValueError(f"SQL question {q_id}: unknown match mode {match!r}")
+            sql_keys[int(q_id)] = SQLAnswerKey(question["answer"], normalized,
+                                               answer_items(normalized) if match == "set" else None)
+
+        python_problems = {
+            problem_id: PythonProblem(
+                problem.get("title", problem_id),
+                float(problem.get("points", 5)),
+                tuple(dict(test) for test in problem["tests"]),
+            )
+            for problem_id, problem in definition.get("python", {}).items()
+        }
+
+        return CompiledExam(
+            exam_id=str(definition["id"]),
+            version=str(definition["version"]),
+            title=definition.get("title", definition["id"]),
+            mcq_answers=MappingProxyType({int(q_id): int(answer) for q_id, answer in definition.get("mcq", {}).items()}),
+            sql_keys=MappingProxyType(sql_keys),
+            python_problems=MappingProxyType(python_problems),
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid exam definition: {e!r}")
+
+
+class QuestionBank:
+    """Compiled exams by ID, reloaded from the exams directory when their version changes"""
+
+    def __init__(self, directory: str, default_exam: str, reload_seconds: float):
+        self.directory = directory
+        self.default_exam = default_exam
+        self.reload_seconds = reload_seconds
+        self._exams: Dict[str, CompiledExam] = {}
+        self._files: Dict[str, tuple] = {}  # path -> ((mtime, size), exam_id)
+        self._reloader: Optional[asyncio.Task] = None
+
+        self.reloads = 0
+        self.errors = 0
+
+    def load(self):
+        """Scan the directory and recompile exams whose file and version changed (blocking)"""
+        exams = dict(self._exams)
+        seen = set()
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self._files.get(path, (None,))[0] == signature:
+                    continue
+                with open(path) as f:
+                    exam = compile_exam(json.load(f))
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                log.error("Failed to load exam %s - %s", path, e, extra={"event": "exam.load_failed"})
+                continue
+
+            self._files[path] = (signature, exam.exam_id)
+            current = exams.get(exam.exam_id)
+            if current is None or current.version != exam.version:
+                exams[exam.exam_id] = exam
+                self.reloads += 1
+                log.info("Loaded exam '%s' version %s from %s", exam.exam_id, exam.version, path,
+                         extra={"event": "exam.loaded", "exam_id": exam.exam_id, "version": exam.version})
+
+        for path in set(self._files) - seen:
+            _, exam_id = self._files.pop(path)
+            exams.pop(exam_id, None)
+            log.info("Removed exam '%s' (%s is gone)", exam_id, path,
+                     extra={"event": "exam.removed", "exam_id": exam_id})
+
+        # Swap in one assignment so readers never see a half-updated bank
+        self._exams = exams
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+        if self.default_exam not in self._exams:
+            log.error("Default exam '%s' not found in %s", self.default_exam, self.directory,
+                      extra={"event": "exam.missing_default"})
+        if self.reload_seconds > 0:
+            self._reloader = asyncio.create_task(self._reload_loop())
+
+    async def stop(self):
+        if self._reloader:
+            self._reloader.cancel()
+            self._reloader = None
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            await asyncio.to_thread(self.load)
+
+    def get(self, exam_id: Optional[str] = None) -> CompiledExam:
+        """The current compiled exam; raises KeyError for an unknown ID"""
+        return self._exams[exam_id or self.default_exam]
+
+    def stats(self) -> dict:
+        return {
+            "exams": {exam_id: exam.version for exam_id, exam in self._exams.items()},
+            "default_exam": self.default_exam,
+            "reloads": self.reloads,
+            "errors": self.errors,
+        }
@@ -0,0 +1,6 @@
+-- Database for graded submissions, kept apart from the mystery dataset so
+-- candidate_user (SELECT on techassess.*) can't read other candidates' results.
+-- The backend creates the tables itself on first write.
+CREATE DATABASE IF NOT EXISTS techassess_results;
+GRANT ALL PRIVILEGES ON techassess_results.* TO 'techuser'@'%';
+FLUSH PRIVILEGES;
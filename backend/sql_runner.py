@@ -0,0 +1,225 @@
+"""
+Guarded execution of candidate SQL.
+
+- Cost guard: an EXPLAIN pre-check rejects queries whose estimated row count
+  is over a threshold before they touch any data.
+- Time limit: every query carries a MAX_EXECUTION_TIME optimizer hint so
+  MySQL stops it server-side, and the backend also enforces the deadline
+  itself, issuing KILL QUERY from a side connection if it passes.
+- Row/byte cap: results are read through pymysql's unbuffered (server-side)
+  cursor in small batches and stop at a hard row/byte cap, so an accidental
+  cross join never materializes in backend memory. When a result is cut
+  short the connection is closed instead of drained (draining an unbuffered
+  result means reading every remaining row off the wire) and the pool
+  discards it.
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import AsyncIterator, List, Optional
+
+import pymysql
+
+from db import kill_query
+
+# Rows fetched from the server per round trip
+FETCH_BATCH = 100
+
+# MySQL error raised when MAX_EXECUTION_TIME interrupts a statement
+ER_QUERY_TIMEOUT = 3024
+
+
+class QueryTimeout(pymysql.err.OperationalError):
+    """The query ran past its time budget and was killed"""
+
+
+class QueryRejected(Exception):
+    """The EXPLAIN pre-check estimated the query as too expensive"""
+
+
+class ResultCap:
+    """Tracks how many rows/bytes a result may still take"""
+
+    def __init__(self, max_rows: int, max_bytes: int):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False
+
+    def take(self, batch: List[dict]) -> List[dict]:
+        """Return the prefix of batch that fits; sets truncated once the cap is hit"""
+        accepted = []
+        for row in batch:
+            size = len(json.dumps(row, default=str))
+            if self.rows >= self.max_rows or self.bytes + size > self.max_bytes:
+                self.truncated = True
+                break
+            accepted.append(row)
+            self.rows += 1
+            self.bytes += size
+        return accepted
+
+
+class QueryGuard:
+    """Per-query limits plus the stage timings reported back to the caller"""
+
+    def __init__(self, timeout: float, max_estimated_rows: Optional[int]):
+        self.timeout = timeout
+        self.max_estimated_rows = max_estimated_rows
+        self.deadline = time.monotonic() + timeout
+        self.started = time.perf_counter()
+        self.explain_ms = 0.0
+        self.estimated_rows = None
+
+    def timings(self) -> dict:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return {
+            "explain_ms": round(self.explain_ms, 2),
+            "query_ms": round(total_ms - self.explain_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "estimated_rows": self.estimated_rows,
+        }
+
+
+def with_time_limit(query: str, timeout: float) -> str:
+    """Add a MAX_EXECUTION_TIME hint right after the leading SELECT"""
+    return f"{query[:6]} /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */{query[6:]}"
+
+
+def estimate_rows(connection, query: str) -> int:
+    """
+    Estimated rows examined according to EXPLAIN: rows multiply across the
+    tables joined within one SELECT and add up across SELECTs.
+    """
+    per_select = defaultdict(lambda: 1.0)
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {query}")
+        for row in cursor.fetchall():
+            rows = row.get("rows")
+            if rows is None:
+                continue
+            filtered = row.get("filtered") or 100.0
+            per_select[row.get("id")] *= max(1.0, float(rows) * float(filtered) / 100.0)
+    return int(sum(per_select.values()))
+
+
+def _finish(connection, cursor, truncated: bool):
+    if truncated:
+        connection.close()
+    else:
+        cursor.close()
+
+
+def fetch_capped(connection, query: str, max_rows: int, max_bytes: int) -> dict:
+    """Run a query and read at most the capped rows (blocking, called from a worker thread)"""
+    cap = ResultCap(max_rows, max_bytes)
+    rows = []
+    cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+    cursor.execute(query)
+    while not cap.truncated:
+        batch = cursor.fetchmany(FETCH_BATCH)
+        if not batch:
+            break
+        rows.extend(cap.take(batch))
+    _finish(connection, cursor, cap.truncated)
+    return {"rows": rows, "truncated": cap.truncated}
+
+
+def _discard_result(task: asyncio.Future):
+    if not task.cancelled():
+        task.exception()
+
+
+def _abandon(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+async def _call(pool, connection, guard: QueryGuard, fn, *args):
+    """
+    Run a blocking call for this connection in a worker thread. If the guard's
+    deadline passes first, kill the running query and raise QueryTimeout.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), max(0.0, guard.deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        if await asyncio.to_thread(kill_query, pool.config, connection.thread_id()):
+            try:
+                await task
+            except Exception:
+                pass
+        else:
+            # The query keeps its worker thread busy until MySQL's own time limit
+            # ends it. Leave the thread to finish on its own, and close the
+            # connection so the pool discards it instead of handing it out.
+            task.add_done_callback(_discard_result)
+            await asyncio.to_thread(_abandon, connection)
+        raise QueryTimeout(ER_QUERY_TIMEOUT, f"Query exceeded the {guard.timeout:g} second time limit")
+    except pymysql.err.OperationalError as e:
+        if e.args and e.args[0] == ER_QUERY_TIMEOUT:
+            raise QueryTimeout(ER_QUERY_TIMEOUT, f"Query exceeded the {guard.timeout:g} second time limit")
+        raise
+
+
+async def _check_cost(pool, connection, query: str, guard: QueryGuard):
+    if not guard.max_estimated_rows:
+        return
+    started = time.perf_counter()
+    guard.estimated_rows = await _call(pool, connection, guard, estimate_rows, connection, query)
+    guard.explain_ms = (time.perf_counter() - started) * 1000
+    if guard.estimated_rows > guard.max_estimated_rows:
+        raise QueryRejected(
+            f"Query rejected: estimated {guard.estimated_rows:,} rows examined "
+            f"(limit {guard.max_estimated_rows:,}). Add filters or join conditions."
+        )
+
+
+async def run_capped(pool, query: str, max_rows: int, max_bytes: int, guard: QueryGuard) -> dict:
+    """Cost-check, then run a query under the guard's deadline and the row/byte cap"""
+    async with pool.connection() as connection:
+        await _check_cost(pool, connection, query, guard)
+        return await _call(pool, connection, guard, fetch_capped,
+                           connection, with_time_limit(query, guard.timeout), max_rows, max_bytes)
+
+
+async def stream_capped(pool, query: str, cap: ResultCap, guard: QueryGuard) -> AsyncIterator[List[dict]]:
+    """
+    Yield batches of rows as they arrive from MySQL, holding one pooled
+    connection for the duration of the stream. If the consumer goes away
+    mid-stream the pool discards the connection along with its unread rows.
+    """
+    async with pool.connection() as connection:
+        await _check_cost(pool, connection, query, guard)
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        await _call(pool, connection, guard, cursor.execute, with_time_limit(query, guard.timeout))
+        while not cap.truncated:
+            batch = await _call(pool, connection, guard, cursor.fetchmany, FETCH_BATCH)
+            if not batch:
+                break
+            rows = cap.take(batch)
+            if rows:
+                yield rows
+        await asyncio.to_thread(_finish, connection, cursor, cap.truncated)
+
+
+class MySQLEngine:
+    """Serves candidate SQL from a MySQL pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.name = pool.name
+
+    async def run_capped(self, query: str, max_rows: int, max_bytes: int, guard: QueryGuard) -> dict:
+        return await run_capped(self.pool, query, max_rows, max_bytes, guard)
+
+    def stream_capped(self, query: str, cap: ResultCap, guard: QueryGuard) -> AsyncIterator[List[dict]]:
+        return stream_capped(self.pool, query, cap, guard)
+
+    def stats(self) -> dict:
+        return {"engine": "mysql", "pool": self.pool.name}
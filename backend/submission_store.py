@@ -0,0 +1,346 @@
+"""
+Durable storage for graded submissions.
+
+Submissions are handed to a write-behind queue and the submit response
+returns right away; a background writer drains the queue in batches with
+multi-row INSERTs. If MySQL is down (or the queue is full) records are
+appended to a local spill file instead, one JSON document per line and
+fsync'd, and replayed into MySQL once it accepts writes again. Only the
+writer task touches the spill file, through worker threads, so a request
+never waits on the disk either. Inserts are
+idempotent on the submission ID, so a batch that is replayed twice after a
+crash doesn't create duplicates.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import pymysql
+
+from metrics import SUBMISSION_WRITE_SECONDS, SUBMISSIONS_SPILLED, timed
+
+log = logging.getLogger(__name__)
+
+# Queue marker telling the writer to flush and exit
+_STOP = object()
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id CHAR(32) PRIMARY KEY,
+        exam_id VARCHAR(64) NOT NULL,
+        exam_version VARCHAR(32) NOT NULL,
+        candidate_name VARCHAR(255),
+        candidate_email VARCHAR(255),
+        mcq_score INT NOT NULL,
+        sql_score INT NOT NULL,
+        python_score INT NOT NULL,
+        total_score INT NOT NULL,
+        max_score INT NOT NULL,
+        tab_switch_count INT NOT NULL DEFAULT 0,
+        violation_flag BOOLEAN NOT NULL DEFAULT FALSE,
+        answers JSON,
+        submitted_at DATETIME(3) NOT NULL,
+        INDEX idx_submissions_email (candidate_email),
+        INDEX idx_submissions_submitted_at (submitted_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS submission_python_results (
+        submission_id CHAR(32) NOT NULL,
+        problem_id VARCHAR(50) NOT NULL,
+        code MEDIUMTEXT,
+        passed INT NOT NULL,
+        total INT NOT NULL,
+        points DECIMAL(6, 2) NOT NULL,
+        timed_out BOOLEAN NOT NULL DEFAULT FALSE,
+        test_results JSON,
+        PRIMARY KEY (submission_id, problem_id)
+    )
+    """,
+]
+
+# Columns added after the tables were first created: (table, column, definition)
+MIGRATIONS = [
+    ("submission_python_results", "test_results", "JSON"),  # pass/fail per hidden test, for cohort analytics
+]
+
+# MySQL error raised when ALTER TABLE adds a column that already exists
+ER_DUP_FIELDNAME = 1060
+
+INSERT_SUBMISSION = """
+    INSERT INTO submissions (id, exam_id, exam_version, candidate_name, candidate_email, mcq_score, sql_score,
+                             python_score, total_score, max_score, tab_switch_count, violation_flag, answers,
+                             submitted_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE id = id
+"""
+
+INSERT_PYTHON_RESULT = """
+    INSERT INTO submission_python_results (submission_id, problem_id, code, passed, total, points, timed_out,
+                                           test_results)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE submission_id = submission_id
+"""
+
+# Re-grading writes the same rows but overwrites the scores of existing ones
+REGRADE_SUBMISSION = INSERT_SUBMISSION.replace("ON DUPLICATE KEY UPDATE id = id", """ON DUPLICATE KEY UPDATE
+        exam_version = VALUES(exam_version), mcq_score = VALUES(mcq_score), sql_score = VALUES(sql_score),
+        python_score = VALUES(python_score), total_score = VALUES(total_score), max_score = VALUES(max_score)""")
+
+REGRADE_PYTHON_RESULT = INSERT_PYTHON_RESULT.replace("ON DUPLICATE KEY UPDATE submission_id = submission_id", """ON DUPLICATE KEY UPDATE
+        passed = VALUES(passed), total = VALUES(total), points = VALUES(points), timed_out = VALUES(timed_out),
+        test_results = VALUES(test_results)""")
+
+
+def new_submission_id() -> str:
+    """
+    Unique submission ID: a millisecond timestamp followed by 80 random bits,
+    so IDs sort by submit time (keeping primary-key inserts append-only) and
+    concurrent submits can't collide.
+    """
+    return f"{time.time_ns() // 1_000_000:012x}{secrets.token_hex(10)}"
+
+
+def submission_rows(record: dict) -> tuple:
+    submission = (
+        record["id"],
+        record["exam_id"],
+        record["exam_version"],
+        record.get("candidate_name"),
+        record.get("candidate_email"),
+        record["mcq_score"],
+        record["sql_score"],
+        record["python_score"],
+        record["total_score"],
+        record["max_score"],
+        record.get("tab_switch_count") or 0,
+        bool(record.get("violation_flag")),
+        json.dumps(record.get("answers") or {}),
+        datetime.fromtimestamp(record["timestamp"], timezone.utc).replace(tzinfo=None),
+    )
+    code = record.get("python_code") or {}
+    test_outcomes = record.get("python_test_outcomes") or {}
+    python_results = [
+        (record["id"], problem_id, code.get(problem_id), result["passed"], result["total"],
+         result["points"], bool(result.get("timed_out")),
+         json.dumps(test_outcomes[problem_id]) if problem_id in test_outcomes else None)
+        for problem_id, result in (record.get("python_results") or {}).items()
+    ]
+    return submission, python_results
+
+
+def write_batch(connection, records: List[dict], submission_sql: str = INSERT_SUBMISSION,
+                python_sql: str = INSERT_PYTHON_RESULT):
+    """
+    Insert a batch of submissions in one transaction (blocking). pymysql
+    turns executemany on a plain VALUES list into a single multi-row INSERT.
+    """
+    submissions, python_results = [], []
+    for record in records:
+        submission, results = submission_rows(record)
+        submissions.append(submission)
+        python_results.extend(results)
+    try:
+        with connection.cursor() as cursor:
+            cursor.executemany(submission_sql, submissions)
+            if python_results:
+                cursor.executemany(python_sql, python_results)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def create_schema(connection):
+    with connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        for table, column, definition in MIGRATIONS:
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            except pymysql.err.OperationalError as e:
+                if e.args[0] != ER_DUP_FIELDNAME:
+                    raise
+    connection.commit()
+
+
+class SubmissionStore:
+    """Write-behind queue in front of the submissions tables"""
+
+    def __init__(self, pool, spill_path: str, batch_size: int, flush_interval: float,
+                 max_queue: int, spill_retry_seconds: float):
+        self.pool = pool
+        self.spill_path = spill_path
+        self.replay_path = spill_path + ".replay"
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_retry_seconds = spill_retry_seconds
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._writer: Optional[asyncio.Task] = None
+        self._schema_ready = False
+        self._next_replay = 0.0
+        # Records turned away by a full queue, spilled by the writer task
+        self._overflow: List[dict] = []
+        # Whether a spill (or replay) file is waiting, tracked here instead of stat'ing on every loop
+        self._spill_pending = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.write_errors = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self._queue.maxsize)
+        # Spill files left by a previous process
+        self._spill_pending = await asyncio.to_thread(
+            lambda: os.path.exists(self.replay_path) or os.path.exists(self.spill_path)
+        )
+        self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush what's queued (to MySQL, or the spill file) and stop the writer"""
+        if self._writer is None:
+            return
+        await self._queue.put(_STOP)
+        await self._writer
+        self._writer = None
+
+    def enqueue(self, record: dict):
+        """Queue a submission for writing; never waits on the database or the disk"""
+        self.enqueued += 1
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            # A full queue means the writer has work to wake up for; it spills these after its current batch
+            log.warning("Submission queue full; spilling %s to %s", record['id'], self.spill_path,
+                        extra={"event": "submission.spilled", "submission_id": record['id']})
+            SUBMISSIONS_SPILLED.labels("queue_full").inc()
+            self._overflow.append(record)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            # Collect up to batch_size records, waiting at most flush_interval after the first
+            batch = []
+            record = await self._next(self.flush_interval if self._spill_pending else None)
+            deadline = time.monotonic() + self.flush_interval
+            while record is not None:
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                record = await self._next(max(0.0, deadline - time.monotonic()))
+            if batch:
+                await self._flush(batch)
+            if self._overflow:
+                records, self._overflow = self._overflow, []
+                await self._spill(records)
+            if not stopping and self._spill_pending and time.monotonic() >= self._next_replay:
+                await self._replay()
+
+    async def _next(self, timeout: Optional[float]) -> Optional[dict]:
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        if timeout is None:
+            return await self._queue.get()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _write(self, records: List[dict]):
+        if not self._schema_ready:
+            await self.pool.run(create_schema)
+            self._schema_ready = True
+        await self.pool.run(write_batch, records)
+
+    async def _flush(self, records: List[dict]):
+        try:
+            with timed(SUBMISSION_WRITE_SECONDS):
+                await self._write(records)
+            self.written += len(records)
+            self.batches += 1
+        except Exception as e:
+            self.write_errors += 1
+            log.error("Failed to write %d submission(s) to MySQL - %s; spilling to %s", len(records), e,
+                      self.spill_path, extra={"event": "submission.spilled", "count": len(records)})
+            SUBMISSIONS_SPILLED.labels("write_failed").inc(len(records))
+            await self._spill(records)
+            self._next_replay = time.monotonic() + self.spill_retry_seconds
+
+    async def _spill(self, records: List[dict]):
+        await asyncio.to_thread(self._append_spill, records)
+        self.spilled += len(records)
+        self._spill_pending = True
+
+    def _append_spill(self, records: List[dict]):
+        with open(self.spill_path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read_replay(self) -> Optional[List[dict]]:
+        """The records to replay, or None when there's no spill file after all"""
+        if not os.path.exists(self.replay_path):
+            if not os.path.exists(self.spill_path):
+                return None
+            # New spills go to a fresh file while this one is replayed
+            os.replace(self.spill_path, self.replay_path)
+        records = []
+        with open(self.replay_path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # torn last line from a crash mid-append
+        return records
+
+    async def _replay(self):
+        """Move spilled records into MySQL; on failure they stay on disk for the next attempt"""
+        records = await asyncio.to_thread(self._read_replay)
+        if records is None:
+            self._spill_pending = False
+            return
+        try:
+            for start in range(0, len(records), self.batch_size):
+                await self._write(records[start:start + self.batch_size])
+        except Exception as e:
+            self.write_errors += 1
+            self._next_replay = time.monotonic() + self.spill_retry_seconds
+            log.error("Replaying spilled submissions failed - %s; retrying in %ss", e, self.spill_retry_seconds,
+                      extra={"event": "submission.replay_failed"})
+            return
+        await asyncio.to_thread(os.remove, self.replay_path)
+        # Spills made while an earlier, failed replay left this file behind went to a new
+        # spill file; that one is replayed next (only the writer task spills, so it's complete)
+        self._spill_pending = await asyncio.to_thread(os.path.exists, self.spill_path)
+        self.replayed += len(records)
+        self.written += len(records)
+        log.info("Replayed %d spilled submission(s) into MySQL", len(records),
+                 extra={"event": "submission.replayed", "count": len(records)})
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "write_errors": self.write_errors,
+            "spill_pending": self._spill_pending,
+        }
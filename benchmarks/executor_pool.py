@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Cold-start vs warm-pool benchmark for the Python executor
+
+Runs the same test-case program through a fresh `python` process per job
+(execute_code_safely) and through the pre-forked WorkerPool, then prints
+per-job latency for both. It also compares grading a 3-test submission with
+one sandbox per test against a single harness-mode sandbox.
+
+Usage: python benchmarks/executor_pool.py [--jobs 30] [--pool-size 2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python_executor"))
+
+from main import execute_code_safely  # noqa: E402
+from pool import WorkerPool  # noqa: E402
+
+SOLUTION = """
+def twoSum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+"""
+
+TESTS = [
+    "print(twoSum([2, 7, 11, 15], 9))",
+    "print(twoSum([3, 2, 4], 6))",
+    "print(twoSum([3, 3], 6))",
+]
+
+SAMPLE_CODE = f"{SOLUTION}\n# Test case\n{TESTS[0]}"
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<12} mean {statistics.mean(timings) * 1000:7.2f} ms   "
+          f"p50 {statistics.median(timings) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms")
+    return statistics.mean(timings)
+
+
+async def bench_cold(jobs):
+    timings = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        result = await execute_code_safely(SAMPLE_CODE)
+        timings.append(time.perf_counter() - start)
+        assert result["success"], result
+    return timings
+
+
+async def bench_warm(jobs, pool_size, max_jobs):
+    pool = WorkerPool(pool_size, max_jobs, {"cpu_seconds": 5, "memory_mb": 256})
+    await pool.start()
+    timings = []
+    try:
+        for _ in range(jobs):
+            start = time.perf_counter()
+            result = await pool.run({"code": SAMPLE_CODE, "timeout": 5})
+            timings.append(time.perf_counter() - start)
+            assert result["returncode"] == 0, result
+    finally:
+        await pool.stop()
+    return timings
+
+
+async def bench_submission(jobs, pool_size, max_jobs):
+    pool = WorkerPool(pool_size, max_jobs, {"cpu_seconds": 20, "memory_mb": 256})
+    await pool.start()
+    per_test, harness = [], []
+    try:
+        for _ in range(jobs):
+            start = time.perf_counter()
+            for test in TESTS:
+                await pool.run({"code": f"{SOLUTION}\n# Test case\n{test}", "timeout": 5})
+            per_test.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            result = await pool.run({"mode": "harness", "code": SOLUTION, "tests": TESTS,
+                                     "test_timeout": 5, "timeout": 20})
+            harness.append(time.perf_counter() - start)
+            assert all(t["success"] for t in result["tests"]), result
+    finally:
+        await pool.stop()
+    return per_test, harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=30)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--max-jobs-per-worker", type=int, default=50)
+    args = parser.parse_args()
+
+    cold = summarize("cold", asyncio.run(bench_cold(args.jobs)))
+    warm = summarize("warm pool", asyncio.run(bench_warm(args.jobs, args.pool_size, args.max_jobs_per_worker)))
+    print(f"speedup      {cold / warm:.1f}x")
+
+    print(f"\n{len(TESTS)}-test submission on the warm pool:")
+    per_test, harness = asyncio.run(bench_submission(args.jobs, args.pool_size, args.max_jobs_per_worker))
+    per_test = summarize("per-test", per_test)
+    harness = summarize("harness", harness)
+    print(f"speedup      {per_test / harness:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
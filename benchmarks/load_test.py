@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Load test for the candidate-facing API endpoints
+
+Drives /api/execute-python, /api/execute-sql and /api/submit-assessment
+with a weighted mix of candidate behaviour (correct and wrong code,
+infinite loops, syntax errors, simple/heavy/invalid SQL, full submissions)
+at increasing concurrency, and reports p50/p95/p99 latency, throughput and
+error rate per scenario and level. A request (including polling a submission
+until it is graded) that takes longer than --request-timeout counts as an
+error; requests still in flight when a level ends are cancelled and reported
+as unfinished, so every level lasts --duration seconds.
+
+Without --url it runs offline against local stand-ins: the executor service
+and the backend are started as subprocesses, the backend serving SQL from
+the embedded engine and spilling submissions to a temp directory instead of
+MySQL. With --max-p95-ms/--max-error-rate it exits non-zero when a level
+exceeds them, so it can be used as a regression gate.
+
+Usage: python benchmarks/load_test.py [--url http://localhost:8000] [--concurrency 1,5,10,25]
+                                      [--duration 15] [--request-timeout 30]
+                                      [--max-p95-ms 5000] [--max-error-rate 0.01]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+TWO_SUM = """
+def twoSum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+"""
+
+TWO_SUM_WRONG = """
+def twoSum(nums, target):
+    return [0, 0]
+"""
+
+INFINITE_LOOP = """
+def twoSum(nums, target):
+    while True:
+        pass
+"""
+
+SYNTAX_ERROR = """
+def twoSum(nums, target)
+    return []
+"""
+
+PALINDROME = """
+def isPalindrome(s):
+    cleaned = ''.join(c.lower() for c in s if c.isalnum())
+    return cleaned == cleaned[::-1]
+"""
+
+TESTS = [
+    {"name": "Test 1", "test": "print(twoSum([2, 7, 11, 15], 9))", "expected": "[0, 1]", "visible": True},
+    {"name": "Test 2", "test": "print(twoSum([3, 2, 4], 6))", "expected": "[1, 2]", "visible": False},
+    {"name": "Test 3", "test": "print(twoSum([3, 3], 6))", "expected": "[0, 1]", "visible": False},
+]
+
+SIMPLE_SQL = "SELECT * FROM security_logs WHERE date = '2024-01-15'"
+HEAVY_SQL = ("SELECT a.log_id, b.user_id, c.access_id, d.traffic_id FROM security_logs a, employees b, "
+             "access_history c, network_traffic d, employee_records e ORDER BY a.log_id, c.access_id")
+INVALID_SQL = "SELECT nope FROM employees"
+
+# Scenario weights in the candidate mix. Wrong answers and timed-out code are
+# normal outcomes, not errors; errors are failed or rejected requests.
+SCENARIOS = {
+    "python_correct": 30,
+    "python_wrong": 10,
+    "python_infinite_loop": 3,
+    "python_syntax_error": 5,
+    "sql_simple": 25,
+    "sql_heavy": 5,
+    "sql_invalid": 7,
+    "submit": 5,
+}
+
+
+def unique(code: str, user: int) -> str:
+    # Candidates rarely submit byte-identical code; keep the executor's result cache honest
+    return f"{code}\n# candidate {user} {random.random()}\n"
+
+
+async def python_request(client, user, code):
+    response = await client.post("/api/execute-python", json={"code": unique(code, user), "test_cases": TESTS},
+                                 headers={"X-Client-Id": f"load-{user}"})
+    response.raise_for_status()
+    body = response.json()
+    # The backend reports executor trouble (queue full, unreachable) as success=False without test results
+    if not body.get("test_mode") and "Executor service error" in (body.get("error") or ""):
+        raise RuntimeError(body["error"][:80])
+    return body
+
+
+async def sql_request(client, user, query, expect_success=True):
+    response = await client.post("/api/execute-sql", json={"query": query})
+    response.raise_for_status()
+    body = response.json()
+    if body["success"] != expect_success:
+        raise RuntimeError(body.get("error") or "unexpected success")
+    return body
+
+
+async def submit_request(client, user):
+    response = await client.post("/api/submit-assessment", json={
+        "mcq": {str(i): 1 for i in range(1, 11)},
+        "sql": {"1": "23:45", "2": "Charlie Davis", "3": "customers, financial_records, salary_data",
+                "4": "Yes", "5": "185.220.101.45"},
+        "python": {"problem1": unique(TWO_SUM, user), "problem2": unique(PALINDROME, user)},
+        "candidate_email": f"load-{user}@example.com",
+    })
+    response.raise_for_status()
+    status_url = response.json()["status_url"]
+    # End-to-end: until grading finishes
+    while True:
+        await asyncio.sleep(0.2)
+        status = (await client.get(status_url)).json()
+        if status["status"] == "done":
+            return status
+        if status["status"] == "failed":
+            raise RuntimeError(status.get("error") or "grading failed")
+
+
+async def run_scenario(client, name, user):
+    if name == "python_correct":
+        return await python_request(client, user, TWO_SUM)
+    if name == "python_wrong":
+        return await python_request(client, user, TWO_SUM_WRONG)
+    if name == "python_infinite_loop":
+        return await python_request(client, user, INFINITE_LOOP)
+    if name == "python_syntax_error":
+        return await python_request(client, user, SYNTAX_ERROR)
+    if name == "sql_simple":
+        return await sql_request(client, user, SIMPLE_SQL)
+    if name == "sql_heavy":
+        return await sql_request(client, user, HEAVY_SQL)
+    if name == "sql_invalid":
+        return await sql_request(client, user, INVALID_SQL, expect_success=False)
+    return await submit_request(client, user)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run_level(client, concurrency, duration, request_timeout):
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name] for name in names]
+    samples = {name: [] for name in names}  # name -> [(latency, error or None)]
+    unfinished = {name: 0 for name in names}  # requests cancelled when the level ended
+    deadline = time.monotonic() + duration
+
+    async def virtual_user(user):
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            error = None
+            try:
+                await asyncio.wait_for(run_scenario(client, name, user), request_timeout)
+            except asyncio.CancelledError:
+                unfinished[name] += 1
+                raise
+            except asyncio.TimeoutError:
+                error = f"no result within {request_timeout:g}s"
+            except httpx.HTTPStatusError as e:
+                error = f"HTTP {e.response.status_code}"
+            except Exception as e:
+                error = type(e).__name__ if not str(e) else str(e)[:80]
+            samples[name].append((time.perf_counter() - start, error))
+
+    started = time.perf_counter()
+    users = [asyncio.create_task(virtual_user(user)) for user in range(concurrency)]
+    _, running = await asyncio.wait(users, timeout=max(0.0, deadline - time.monotonic()))
+    for task in running:
+        task.cancel()
+    await asyncio.gather(*running, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    report = {"concurrency": concurrency, "elapsed": round(elapsed, 2), "scenarios": {}}
+    all_latencies, all_errors = [], 0
+    for name, results in samples.items():
+        latencies = sorted(latency for latency, _ in results)
+        errors = [error for _, error in results if error]
+        all_latencies.extend(latencies)
+        all_errors += len(errors)
+        report["scenarios"][name] = {
+            "requests": len(results),
+            "rps": round(len(results) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "error_rate": round(len(errors) / len(results), 4) if results else 0.0,
+            "errors": sorted(set(errors))[:3],
+            "unfinished": unfinished[name],
+        }
+    all_latencies.sort()
+    report["total"] = {
+        "requests": len(all_latencies),
+        "rps": round(len(all_latencies) / elapsed, 2),
+        "p50_ms": round(percentile(all_latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(all_latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(all_latencies, 0.99) * 1000, 1),
+        "error_rate": round(all_errors / len(all_latencies), 4) if all_latencies else 0.0,
+        "unfinished": sum(unfinished.values()),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"\nconcurrency {report['concurrency']} ({report['elapsed']}s)")
+    print(f"  {'scenario':<22}{'reqs':>6}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+          f"{'unfinished':>12}")
+    rows = list(report["scenarios"].items()) + [("total", report["total"])]
+    for name, row in rows:
+        print(f"  {name:<22}{row['requests']:>6}{row['rps']:>8.1f}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['error_rate']:>9.1%}{row['unfinished']:>12}")
+        for error in row.get("errors", []):
+            print(f"  {'':<22}  ! {error}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+@contextmanager
+def local_stack():
+    """Executor + backend on free ports, with the embedded SQL engine and no MySQL"""
+    workdir = tempfile.mkdtemp(prefix="techassess-load-")
+    executor_port, backend_port = free_port(), free_port()
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    backend_env = {
+        **env,
+        "PYTHON_EXECUTOR_URL": f"http://127.0.0.1:{executor_port}",
+        "SQL_ENGINE": "embedded",
+        "MYSQL_HOST": "127.0.0.1",
+        "MYSQL_PORT": str(free_port()),  # nothing listens: submission writes spill locally
+        "SUBMISSION_SPILL_PATH": os.path.join(workdir, "submissions.spill.jsonl"),
+        "GRADING_QUEUE_PATH": os.path.join(workdir, "grading_jobs.db"),
+    }
+    processes = []
+    try:
+        for cwd, port, process_env, health in (
+            ("python_executor", executor_port, env, "/health"),
+            ("backend", backend_port, backend_env, "/"),
+        ):
+            log = open(os.path.join(workdir, f"{cwd}.log"), "w")
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+                cwd=os.path.join(ROOT, cwd), env=process_env, stdout=log, stderr=subprocess.STDOUT,
+            ))
+            wait_until_up(f"http://127.0.0.1:{port}{health}")
+        print(f"Local stack up (logs in {workdir})")
+        yield f"http://127.0.0.1:{backend_port}"
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+async def run(url, levels, duration, request_timeout):
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        reports = []
+        for concurrency in levels:
+            report = await run_level(client, concurrency, duration, request_timeout)
+            print_report(report)
+            reports.append(report)
+        return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Backend to test (default: start a local offline stack)")
+    parser.add_argument("--concurrency", default="1,5,10,25", help="Comma-separated virtual-user counts")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per concurrency level")
+    parser.add_argument("--request-timeout", type=float, default=30,
+                        help="Seconds a request (or a submission's grading) may take before it counts as an error")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the reports to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if any level's overall p95 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if any level's overall error rate exceeds this")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    if args.url:
+        reports = asyncio.run(run(args.url, levels, args.duration, args.request_timeout))
+    else:
+        with local_stack() as url:
+            reports = asyncio.run(run(url, levels, args.duration, args.request_timeout))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    failures = []
+    for report in reports:
+        total = report["total"]
+        if args.max_p95_ms is not None and total["p95_ms"] > args.max_p95_ms:
+            failures.append(f"concurrency {report['concurrency']}: p95 {total['p95_ms']} ms > {args.max_p95_ms} ms")
+        if args.max_error_rate is not None and total["error_rate"] > args.max_error_rate:
+            failures.append(f"concurrency {report['concurrency']}: error rate {total['error_rate']:.2%} "
+                            f"> {args.max_error_rate:.2%}")
+    for failure in failures:
+        print(f"✗ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
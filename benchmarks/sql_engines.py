@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+MySQL vs embedded SQLite latency benchmark for candidate SQL
+
+Checks that both engines resolve the five mystery questions to the expected
+answers, then runs a set of typical candidate queries through each engine
+(uncached, straight through run_capped) and prints per-query latency. MySQL
+is skipped when it isn't reachable, so the embedded numbers and the
+compatibility check can still be taken on a laptop.
+
+Usage: python benchmarks/sql_engines.py [--runs 200]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from embedded_sql import EmbeddedSQLEngine, answer_mismatches, resolve_mystery_answers  # noqa: E402
+from main import CANDIDATE_CONFIG, SQL_FIXTURE, question_bank  # noqa: E402
+from db import MySQLPool  # noqa: E402
+from sql_runner import MySQLEngine, QueryGuard  # noqa: E402
+
+QUERIES = [
+    "SELECT * FROM security_logs WHERE date = '2024-01-15'",
+    "SELECT e.name, s.access_time FROM employees e JOIN security_logs s ON e.user_id = s.user_id",
+    "SELECT table_name FROM access_history WHERE user_id = 103 ORDER BY table_name",
+    "SELECT user_id, SUM(data_size_mb) AS total FROM network_traffic GROUP BY user_id ORDER BY total DESC",
+]
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<12} mean {statistics.mean(timings) * 1000:7.2f} ms   "
+          f"p50 {statistics.median(timings) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms")
+    return statistics.mean(timings)
+
+
+async def check_answers(label, engine, expected):
+    mismatches = answer_mismatches(await resolve_mystery_answers(engine), expected)
+    for question_id, (got, answer) in mismatches.items():
+        print(f"✗ {label}: question {question_id} resolves to {got!r}, expected {answer!r}")
+    if not mismatches:
+        print(f"✓ {label}: all {len(expected)} mystery answers match")
+    return not mismatches
+
+
+async def bench(engine, runs):
+    timings = []
+    for i in range(runs):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        await engine.run_capped(query, 1000, 1024 * 1024, QueryGuard(5, None))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def run(runs):
+    embedded = EmbeddedSQLEngine(SQL_FIXTURE)
+    print(f"embedded fixture loaded in {embedded.load_ms} ms")
+    pool = MySQLPool("candidate", CANDIDATE_CONFIG, 1, 30, 10, connect_timeout=2)
+    mysql = MySQLEngine(pool)
+    mysql_available = await pool.ping()
+    if not mysql_available:
+        print("MySQL unreachable; skipping the MySQL side")
+
+    question_bank.load()
+    expected = question_bank.get().sql_answers()
+    compatible = await check_answers("embedded", embedded, expected)
+    if mysql_available:
+        compatible = await check_answers("mysql", mysql, expected) and compatible
+
+    print(f"\n{runs} queries per engine:")
+    try:
+        if mysql_available:
+            mysql_mean = summarize("mysql", await bench(mysql, runs))
+        embedded_mean = summarize("embedded", await bench(embedded, runs))
+        if mysql_available:
+            print(f"speedup      {mysql_mean / embedded_mean:.1f}x")
+    finally:
+        await pool.close()
+    return compatible
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.runs)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Health of a service's dependencies, checked in the background (shared by the
+backend and the executor).
+
+/health is hit constantly by Docker healthchecks and load balancers. Instead
+of checking MySQL, the executors or the sandbox pool on every probe, a
+background task runs every check on an interval and /health serves the latest
+snapshot, with how old it is and each dependency's latency. A probe never
+waits on a dependency, so probes can't pile up while one is slow.
+
+A check that is still running when the next round starts is not started
+again; it is reported as down until it finishes.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+# Seconds between rounds of dependency checks
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 5))
+
+# Seconds a check may take before it is reported as down
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 3))
+
+# A snapshot older than this is flagged stale (defaults to three intervals)
+HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', 3 * HEALTH_CHECK_INTERVAL))
+
+log = logging.getLogger(__name__)
+
+
+class DependencyDown(Exception):
+    """Raised by a check to report its dependency as down, optionally with details"""
+
+    def __init__(self, message: str, details: Optional[dict] = None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+# A check returns details to report when the dependency is up, and raises when it is down
+HealthCheck = Callable[[], Awaitable[Optional[dict]]]
+
+
+class HealthMonitor:
+    def __init__(self, checks: Dict[str, HealthCheck], critical: Iterable[str] = (),
+                 interval: float = HEALTH_CHECK_INTERVAL, timeout: float = HEALTH_CHECK_TIMEOUT,
+                 stale_after: float = HEALTH_STALE_AFTER):
+        self.checks = checks
+        self.critical = set(critical)
+        self.interval = interval
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self._results: Dict[str, dict] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._checked_at: Optional[float] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self.rounds = 0
+
+    async def start(self):
+        """Run the first round (bounded by the check timeout), then keep checking in the background"""
+        await self.run_checks()
+        self._loop_task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for task in self._running.values():
+            task.cancel()
+        self._running.clear()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_checks()
+
+    async def run_checks(self):
+        """Run one round of checks concurrently and publish the results"""
+        await asyncio.gather(*(self._run_check(name, check) for name, check in self.checks.items()))
+        self._checked_at = time.time()
+        self.rounds += 1
+
+    async def _run_check(self, name: str, check: HealthCheck):
+        task = self._running.get(name)
+        if task is None:
+            task = asyncio.create_task(self._timed_check(check))
+            self._running[name] = task
+            task.add_done_callback(lambda _, name=name: self._running.pop(name, None))
+        # Wait without cancelling: an abandoned check keeps its slot until it finishes
+        done, _ = await asyncio.wait({task}, timeout=self.timeout)
+        if done:
+            result = task.result()
+        else:
+            result = {"status": "down", "latency_ms": None,
+                      "error": f"No answer within {self.timeout:g} seconds"}
+        result["checked_at"] = round(time.time(), 3)
+
+        previous = self._results.get(name, {}).get("status")
+        if previous is not None and previous != result["status"]:
+            log.log(logging.INFO if result["status"] == "up" else logging.WARNING,
+                    "Dependency %s is %s", name, result["status"],
+                    extra={"event": "health.changed", "dependency": name, "status": result["status"],
+                           "error": result.get("error")})
+        self._results[name] = result
+
+    @staticmethod
+    async def _timed_check(check: HealthCheck) -> dict:
+        started = time.perf_counter()
+        try:
+            details = await check() or {}
+            status, error = "up", None
+        except DependencyDown as e:
+            details, status, error = e.details, "down", str(e)
+        except Exception as e:
+            details, status, error = {}, "down", f"{type(e).__name__}: {e}"
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        return {"status": status, "latency_ms": latency_ms, "error": error, **details}
+
+    def is_up(self, name: str) -> bool:
+        return self._results.get(name, {}).get("status") == "up"
+
+    def snapshot(self) -> dict:
+        """The latest results; costs no I/O"""
+        if self._checked_at is None:
+            status = "starting"
+        elif any(not self.is_up(name) for name in self.critical):
+            status = "unhealthy"
+        elif any(not self.is_up(name) for name in self.checks):
+            status = "degraded"
+        else:
+            status = "healthy"
+        age = time.time() - self._checked_at if self._checked_at is not None else None
+        return {
+            "status": status,
+            "checked_at": round(self._checked_at, 3) if self._checked_at is not None else None,
+            "age_seconds": round(age, 3) if age is not None else None,
+            "stale": age is None or age > self.stale_after,
+            "dependencies": dict(self._results),
+        }
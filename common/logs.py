@@ -0,0 +1,196 @@
+"""
+Structured, non-blocking logging, shared by the backend and the executor.
+
+Records are rendered as one JSON object per line. Handlers on the request
+path only put the record on a bounded in-memory queue (QueueHandler); a
+background thread (QueueListener) does the actual stdout writes, so a slow
+or blocked stdout never stalls the event loop. If the queue is full the
+record is dropped and counted rather than waited on.
+
+Every record carries the ID of the request it was logged under. The ID is
+taken from the caller's X-Request-Id header (or generated) and returned in
+the response; the backend forwards it to the executor, so one submission can
+be followed across both services. High-volume events can be sampled per event name;
+warnings and errors are never sampled out.
+
+Log with a stable event name plus fields, e.g.
+    log.info("Query served", extra={"event": "sql.query", "engine": "mysql"})
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi import Request
+
+# Minimum level written (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Fraction of INFO/DEBUG records kept per event, e.g. "http.request=0.1,mysql.connect=0.5"
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
+# Records buffered for the writer thread before new ones are dropped
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+REQUEST_ID_HEADER = "X-Request-Id"
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+log = logging.getLogger("http")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in spec.split(","):
+        event, _, rate = item.partition("=")
+        if event.strip() and rate.strip():
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+class JSONFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the current request ID on records and samples high-volume events"""
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = self.sample_rates.get(getattr(record, "event", None))
+            if rate is not None and random.random() >= rate:
+                return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that formats in the caller and drops records instead of blocking when full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> str:
+        # Only the rendered line crosses to the writer thread
+        return self.format(record)
+
+    def enqueue(self, line: str):
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LineWriter:
+    """QueueListener handler writing pre-rendered lines to stdout"""
+
+    level = logging.NOTSET
+
+    def handle(self, line: str):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+class LogPipeline:
+    """Queue handler installed on the root logger plus the thread draining it"""
+
+    def __init__(self, service: str):
+        self._queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.handler = DroppingQueueHandler(self._queue)
+        self.handler.setFormatter(JSONFormatter(service))
+        self.handler.addFilter(ContextFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+        self._listener = logging.handlers.QueueListener(self._queue, _LineWriter())
+        self._running = False
+
+        root = logging.getLogger()
+        root.handlers = [self.handler]
+        root.setLevel(LOG_LEVEL)
+        # httpx logs every request at INFO; the http.request event already covers them
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    def start(self):
+        if not self._running:
+            self._listener.start()
+            self._running = True
+
+    def stop(self):
+        """Flush what's queued and stop the writer thread"""
+        if self._running:
+            self._listener.stop()
+            self._running = False
+
+    def stats(self) -> dict:
+        return {"level": LOG_LEVEL, "queued": self._queue.qsize(), "dropped": self.handler.dropped}
+
+
+async def track_request_ids(request: Request, call_next):
+    """HTTP middleware: adopt or assign a request ID, echo it back and log the request"""
+    incoming = request.headers.get(REQUEST_ID_HEADER, "")
+    request_id = incoming if _VALID_REQUEST_ID.match(incoming) else new_request_id()
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        log.log(
+            logging.WARNING if status >= 500 else logging.INFO,
+            "%s %s -> %s", request.method, request.url.path, status,
+            extra={
+                "event": "http.request",
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        )
+        request_id_var.reset(token)
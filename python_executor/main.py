@@ -1,15 +1,141 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from typing import List, Optional
-import subprocess
+import asyncio
+import codecs
+import json
+import logging
 import sys
 import os
-import signal
-import tempfile
-import traceback
+import time
 
-app = FastAPI(title="Python Code Executor")
+# Modules shared by both services (logs, health) live in common/, next to the service
+# directories in a checkout and at /common in the images
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+
+from health import DependencyDown, HealthMonitor
+from logs import LogPipeline, track_request_ids
+from metrics import (
+    CACHE_LOOKUPS, EARLY_MISMATCHES, PREFLIGHT_REJECTIONS, PREFLIGHT_SECONDS, QUEUE_WAIT_SECONDS, REJECTIONS, SANDBOX_RUN_SECONDS,
+    SANDBOX_RUNS_AVOIDED, SANDBOX_SPAWN_SECONDS, TEST_RUN_SECONDS, TIMEOUTS, metrics_response, record_stage, timed,
+    track_requests,
+)
+from pool import WORKER_SCRIPT, WorkerPool, WorkerError
+from preflight import Preflight, preflight
+from result_cache import ResultCache, cache_key
+from sandbox_worker import COMPARATORS, StreamingCheck, apply_limits, max_output_bytes, output_matches
+from scheduler import FairScheduler, SchedulerFull
+
+# JSON logs written by a background thread (LOG_LEVEL, LOG_SAMPLE_RATES)
+log_pipeline = LogPipeline("executor")
+log = logging.getLogger("executor")
+
+# Bump when a change can alter execution outcomes; invalidates cached results
+EXECUTOR_VERSION = "4"
+
+# Execution configuration
+EXECUTION_TIMEOUT = int(os.getenv('EXECUTION_TIMEOUT', 5))
+
+# Warm worker pool configuration
+POOL_ENABLED = os.getenv('EXECUTOR_POOL_ENABLED', 'true').lower() == 'true' and hasattr(os, 'fork')
+POOL_SIZE = int(os.getenv('EXECUTOR_POOL_SIZE', os.cpu_count() or 2))
+MAX_JOBS_PER_WORKER = int(os.getenv('EXECUTOR_MAX_JOBS_PER_WORKER', 50))
+
+# Per-job resource limits applied inside the sandbox (the "default" profile). The CPU limit
+# defaults to a second past the wall-clock timeout, so a busy loop is reported as a timeout
+# rather than dying of SIGXCPU just before it
+SANDBOX_LIMITS = {
+    'cpu_seconds': int(os.getenv('SANDBOX_CPU_SECONDS', EXECUTION_TIMEOUT + 1)),
+    'memory_mb': int(os.getenv('SANDBOX_MEMORY_MB', 256)),
+    'max_output_kb': int(os.getenv('SANDBOX_MAX_OUTPUT_KB', 64)),  # Per stream, or per test in harness mode
+    'max_file_mb': int(os.getenv('SANDBOX_MAX_FILE_MB', 1)),
+    'max_open_files': int(os.getenv('SANDBOX_MAX_OPEN_FILES', 64)),
+    'allow_subprocesses': os.getenv('SANDBOX_ALLOW_SUBPROCESSES', 'false').lower() == 'true',
+}
+
+# Further profiles requests can pick by name: JSON of name -> overrides of the default profile
+SANDBOX_PROFILES = {
+    'default': SANDBOX_LIMITS,
+    **{
+        name: {**SANDBOX_LIMITS, **overrides}
+        for name, overrides in json.loads(os.getenv('SANDBOX_PROFILES') or '{}').items()
+    },
+}
+
+# Admission control: concurrent executions, total queued jobs, queued jobs per client
+MAX_CONCURRENCY = int(os.getenv('EXECUTOR_MAX_CONCURRENCY', POOL_SIZE))
+MAX_QUEUE = int(os.getenv('EXECUTOR_MAX_QUEUE', 100))
+MAX_QUEUE_PER_CLIENT = int(os.getenv('EXECUTOR_MAX_QUEUE_PER_CLIENT', 4))
+
+# Compare test output with the expected output while it is printed, stopping a test once it can't match
+STREAMING_COMPARE = os.getenv('EXECUTOR_STREAMING_COMPARE', 'true').lower() == 'true'
+# Bytes a test may print past its expected output's size before it is stopped
+OUTPUT_SLACK_BYTES = int(os.getenv('EXECUTOR_OUTPUT_SLACK_BYTES', 1024))
+
+# Static checks (syntax, functions the tests call) that fail code before it reaches a sandbox
+PREFLIGHT_ENABLED = os.getenv('EXECUTOR_PREFLIGHT_ENABLED', 'true').lower() == 'true'
+
+# Cache of deterministic execution outcomes
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_MB', 64)) * 1024 * 1024
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 3600))
+
+# Everything besides code and test that affects an outcome goes into the cache key
+CACHE_VERSIONS = {
+    name: f"{EXECUTOR_VERSION}:{sys.version}:{EXECUTION_TIMEOUT}:{name}:{sorted(limits.items())}"
+    for name, limits in SANDBOX_PROFILES.items()
+}
+
+worker_pool: Optional[WorkerPool] = None
+scheduler = FairScheduler(MAX_CONCURRENCY, MAX_QUEUE, MAX_QUEUE_PER_CLIENT)
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
+preflight_stats = {"checked": 0, "syntax_errors": 0, "missing_functions": 0, "tests_failed": 0,
+                   "sandbox_runs_avoided": 0}
+
+
+async def check_sandbox_pool() -> dict:
+    if worker_pool is None:
+        return {"mode": "cold"}
+    pool = worker_pool.stats()
+    if not pool["alive"] and not pool["refilling"]:
+        raise DependencyDown("No live sandbox workers", pool)
+    return pool
+
+
+async def check_scheduler() -> dict:
+    queue = scheduler.stats()
+    if queue["queued"] >= queue["max_queue"]:
+        raise DependencyDown("Admission queue is full", queue)
+    return queue
+
+
+# Background checks served from a snapshot on /health; without sandbox workers the
+# executor is unhealthy (503), with a full queue only degraded
+health_monitor = HealthMonitor(
+    {"sandbox_pool": check_sandbox_pool, "scheduler": check_scheduler},
+    critical=["sandbox_pool"],
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global worker_pool
+    log_pipeline.start()
+    if POOL_ENABLED:
+        worker_pool = WorkerPool(POOL_SIZE, MAX_JOBS_PER_WORKER, SANDBOX_LIMITS)
+        await worker_pool.start()
+    await health_monitor.start()
+    yield
+    await health_monitor.stop()
+    if worker_pool:
+        await worker_pool.stop()
+        worker_pool = None
+    log_pipeline.stop()
+
+
+app = FastAPI(title="Python Code Executor", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -20,17 +146,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and the per-stage Server-Timing header
+app.middleware("http")(track_requests)
+# Request IDs (outermost, so everything below logs under the request's ID)
+app.middleware("http")(track_request_ids)
+
 
 class TestCase(BaseModel):
     name: str
     test: str
     expected: str
     visible: bool = False
+    comparator: str = "exact"  # How output is compared with expected (sandbox_worker.COMPARATORS)
 
 
 class ExecuteRequest(BaseModel):
     code: str
     test_cases: Optional[List[TestCase]] = None
+    profile: str = "default"  # Sandbox resource profile (SANDBOX_PROFILES)
+    entry_points: Optional[List[str]] = None  # Functions the code must define; inferred from the tests if omitted
 
 
 @app.get("/")
@@ -40,97 +174,479 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    """Latest snapshot from the background health checks"""
+    snapshot = health_monitor.snapshot()
+    return JSONResponse(snapshot, status_code=503 if snapshot["status"] == "unhealthy" else 200)
 
 
-def execute_code_safely(code: str, timeout: int = 5) -> dict:
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "version": EXECUTOR_VERSION,
+        "sandbox_profiles": SANDBOX_PROFILES,
+        "scheduler": scheduler.stats(),
+        "result_cache": result_cache.stats(),
+        "preflight": {"enabled": PREFLIGHT_ENABLED, **preflight_stats},
+        "streaming_compare": {"enabled": STREAMING_COMPARE, "output_slack_bytes": OUTPUT_SLACK_BYTES},
+        "logging": log_pipeline.stats()
+    }
+
+
+def output_limit_error(limits: dict) -> str:
+    return f"Output limit exceeded ({limits['max_output_kb']} KB)"
+
+
+def kill_process(process: asyncio.subprocess.Process):
+    """Kill a sandbox process unless it has already exited and been reaped"""
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def read_bounded(process: asyncio.subprocess.Process, stream: asyncio.StreamReader,
+                       limit: Optional[int], check: Optional[StreamingCheck] = None) -> tuple:
     """
-    Execute Python code safely with timeout and resource limits
+    Read a stream to EOF keeping at most limit bytes, killing the process past
+    it or once check fails; returns (data, hit_limit, mismatched)
     """
+    data = bytearray()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(data), False, False
+        if limit is not None and len(data) + len(chunk) > limit:
+            data += chunk[:limit - len(data)]
+            kill_process(process)
+            return bytes(data), True, False
+        data += chunk
+        if check is not None and not check.feed(decoder.decode(chunk)):
+            kill_process(process)
+            return bytes(data), False, True
+
+
+async def feed_stdin(process: asyncio.subprocess.Process, data: bytes):
     try:
-        # Create a temporary file to store the code
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
+        process.stdin.write(data)
+        await process.stdin.drain()
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # exited before reading all of it; its output says why
 
-        try:
-            # Execute with timeout and resource limits
-            result = subprocess.run(
-                [sys.executable, temp_file],
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                # Security: Prevent network access and file operations
-                env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
-            )
-
-            # Clean up
-            os.unlink(temp_file)
-
-            if result.returncode == 0:
-                return {
-                    "success": True,
-                    "output": result.stdout,
-                    "error": None
-                }
-            else:
-                return {
-                    "success": False,
-                    "output": result.stdout,
-                    "error": result.stderr
-                }
 
-        except subprocess.TimeoutExpired:
-            os.unlink(temp_file)
+def read_usage(fd: int) -> Optional[dict]:
+    """The usage a cold sandbox reported as it exited; None if it was killed first"""
+    os.set_blocking(fd, False)
+    try:
+        return json.loads(os.read(fd, 4096))
+    except (BlockingIOError, ValueError):
+        return None
+    finally:
+        os.close(fd)
+
+
+async def execute_code_safely(code: str, timeout: int = EXECUTION_TIMEOUT, limits: Optional[dict] = None,
+                              check: Optional[StreamingCheck] = None) -> dict:
+    """
+    Execute Python code in a fresh interpreter process with a timeout.
+    Uses an asyncio subprocess so the event loop keeps serving other requests.
+    The code is piped to the sandbox's stdin; nothing touches the filesystem.
+    With a check, the process is killed as soon as its stdout can't match.
+    The sandbox reports its CPU time and peak RSS on a pipe as it exits.
+    """
+    limits = limits or SANDBOX_LIMITS
+    usage_r = usage_w = None
+    try:
+        usage_r, usage_w = os.pipe()
+        with timed(SANDBOX_SPAWN_SECONDS, stage="spawn", kind="cold"):
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable, "-I", "-B", WORKER_SCRIPT, "--script", "--usage-fd", str(usage_w),
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    pass_fds=(usage_w,),
+                    preexec_fn=lambda: apply_limits(limits)
+                )
+            finally:
+                os.close(usage_w)
+        try:
+            with timed(SANDBOX_RUN_SECONDS, stage="sandbox", mode="cold"):
+                _, (stdout, stdout_limited, mismatched), (stderr, stderr_limited, _) = await asyncio.wait_for(
+                    asyncio.gather(
+                        feed_stdin(process, code.encode()),
+                        read_bounded(process, process.stdout, max_output_bytes(limits), check),
+                        read_bounded(process, process.stderr, max_output_bytes(limits)),
+                    ), timeout)
+                await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            kill_process(process)  # still out of time even if it already died (e.g. of its CPU limit)
+            await process.wait()
+            TIMEOUTS.labels("job").inc()
             return {
                 "success": False,
                 "output": None,
-                "error": "Execution timeout exceeded (5 seconds)"
+                "error": f"Execution timeout exceeded ({timeout} seconds)",
+                "transient": True
             }
-        except Exception as e:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
+
+        usage, usage_r = read_usage(usage_r), None
+        if mismatched:
+            EARLY_MISMATCHES.labels("cold").inc()
+            return {"success": True, "output": stdout.decode(errors='replace'), "error": None, "mismatch": True,
+                    "usage": usage}
+
+        if stdout_limited or stderr_limited:
             return {
                 "success": False,
-                "output": None,
-                "error": f"Execution error: {str(e)}"
+                "output": stdout.decode(errors='replace'),
+                "error": output_limit_error(limits),
+                "usage": usage
+            }
+
+        if process.returncode == 0:
+            return {
+                "success": True,
+                "output": stdout.decode(errors='replace'),
+                "error": None,
+                "usage": usage
+            }
+        else:
+            return {
+                "success": False,
+                "output": stdout.decode(errors='replace'),
+                "error": stderr.decode(errors='replace'),
+                "usage": usage
             }
 
     except Exception as e:
         return {
             "success": False,
             "output": None,
-            "error": f"Code preparation error: {str(e)}"
+            "error": f"Execution error: {str(e)}",
+            "transient": True
         }
+    finally:
+        if usage_r is not None:
+            os.close(usage_r)
+
+
+async def run_code(code: str, timeout: int = EXECUTION_TIMEOUT, profile: str = "default") -> dict:
+    """
+    Execute Python code, serving repeat runs of unchanged code from the result cache
+    """
+    key = cache_key(CACHE_VERSIONS[profile], code)
+    cached = result_cache.get(key)
+    CACHE_LOOKUPS.labels("miss" if cached is None else "hit").inc()
+    if cached is not None:
+        return cached
+
+    result = await _run_code_uncached(code, timeout, SANDBOX_PROFILES[profile])
+    if not result.pop("transient", False):
+        result_cache.put(key, result)
+    return result
+
+
+async def _run_code_uncached(code: str, timeout: int, limits: dict, check: Optional[StreamingCheck] = None) -> dict:
+    """
+    Execute Python code in a warm pool worker, falling back to a cold process.
+    Outcomes that depend on load rather than the code (timeouts, sandbox
+    failures) are flagged "transient" so they aren't cached.
+    """
+    if worker_pool is None:
+        return await execute_code_safely(code, timeout, limits, check)
+
+    try:
+        result = await worker_pool.run({"code": code, "timeout": timeout, "limits": limits})
+    except WorkerError as e:
+        return {
+            "success": False,
+            "output": None,
+            "error": f"Execution error: {str(e)}",
+            "transient": True
+        }
+
+    if result.get("error"):
+        return {"success": False, "output": None, "error": result["error"], "transient": True}
+
+    if result["timed_out"]:
+        TIMEOUTS.labels("job").inc()
+        return {
+            "success": False,
+            "output": None,
+            "error": f"Execution timeout exceeded ({timeout} seconds)",
+            "transient": True
+        }
+
+    usage = result["usage"]
+    if result["output_limited"]:
+        return {"success": False, "output": result["stdout"], "error": output_limit_error(limits), "usage": usage}
+
+    if result["returncode"] == 0:
+        return {"success": True, "output": result["stdout"], "error": None, "usage": usage}
+
+    return {"success": False, "output": result["stdout"], "error": result["stderr"], "usage": usage}
+
+
+def _test_cache_keys(code: str, test_cases: List[TestCase], profile: str) -> List[str]:
+    # A test stopped on diverging output depends on what it was compared with
+    return [
+        cache_key(CACHE_VERSIONS[profile], code, f"{test_case.test}\0{test_case.expected}\0{test_case.comparator}"
+                  if STREAMING_COMPARE else test_case.test)
+        for test_case in test_cases
+    ]
+
+
+def streaming_check(test_case: TestCase) -> Optional[StreamingCheck]:
+    if not STREAMING_COMPARE:
+        return None
+    return StreamingCheck(test_case.expected, test_case.comparator, OUTPUT_SLACK_BYTES)
+
+
+async def run_tests(code: str, test_cases: List[TestCase], timeout: int = EXECUTION_TIMEOUT,
+                    profile: str = "default") -> List[dict]:
+    """
+    Run every test case against the code, returning one run_code-shaped result per test.
+    Cached outcomes are reused; only the remaining tests are executed.
+    """
+    keys = _test_cache_keys(code, test_cases, profile)
+    outcomes = [result_cache.get(key) for key in keys]
+    missing = [index for index, outcome in enumerate(outcomes) if outcome is None]
+    CACHE_LOOKUPS.labels("hit").inc(len(outcomes) - len(missing))
+    CACHE_LOOKUPS.labels("miss").inc(len(missing))
+
+    if missing:
+        fresh = await _run_tests_uncached(code, [test_cases[index] for index in missing], timeout,
+                                          SANDBOX_PROFILES[profile])
+        for index, outcome in zip(missing, fresh):
+            if not outcome.pop("transient", False):
+                result_cache.put(keys[index], outcome)
+            outcomes[index] = outcome
+    return outcomes
+
+
+async def _run_tests_uncached(code: str, test_cases: List[TestCase], timeout: int, profile_limits: dict) -> List[dict]:
+    """
+    With the worker pool the code is compiled once and all tests run in the same sandbox,
+    each in a fresh module namespace (see _run_harness_job).
+    """
+    if worker_pool is None:
+        outcomes = []
+        for test_case in test_cases:
+            with timed(TEST_RUN_SECONDS):
+                outcomes.append(await _run_code_uncached(
+                    f"{code}\n\n# Test case\n{test_case.test}", timeout, profile_limits, streaming_check(test_case)
+                ))
+        return outcomes
+
+    outcomes: List[Optional[dict]] = [None] * len(test_cases)
+    pending = list(range(len(test_cases)))
+    while pending:
+        pending = await _run_harness_job(code, test_cases, pending, outcomes, timeout, profile_limits)
+    return outcomes
+
+
+async def _run_harness_job(code: str, test_cases: List[TestCase], indexes: List[int], outcomes: List[Optional[dict]],
+                           timeout: int, profile_limits: dict) -> List[int]:
+    """
+    Run the given tests as one harness job, filling in their outcomes. Output is
+    compared here as the job prints it: the expected outputs never enter the
+    sandbox, where candidate code could read them. The job is stopped at the
+    first test that can't match; returns the tests after it, which still need a run.
+    """
+    checks = [streaming_check(test_cases[index]) for index in indexes]
+    printed: List[List[str]] = [[] for _ in indexes]
+    stopped = None
+
+    def on_output(position: int, text: str) -> bool:
+        nonlocal stopped
+        printed[position].append(text)
+        check = checks[position]
+        if check is None or check.feed(text):
+            return True
+        stopped = position
+        return False
+
+    # One time budget for loading the code plus one per test
+    budget = len(indexes) + 1
+    limits = {**profile_limits, 'cpu_seconds': profile_limits['cpu_seconds'] * budget}
+    try:
+        result = await worker_pool.run({
+            "mode": "harness",
+            "code": code,
+            "tests": [test_cases[index].test for index in indexes],
+            "stream": STREAMING_COMPARE,
+            "test_timeout": timeout,
+            "timeout": timeout * budget,
+            "limits": limits,
+        }, on_output)
+    except WorkerError as e:
+        result = {"error": f"Execution error: {str(e)}"}
+
+    if result.get("error"):
+        for index in indexes:
+            outcomes[index] = {"success": False, "output": None, "error": result["error"], "transient": True}
+        return []
+
+    frames = {frame["index"]: frame for frame in result["tests"]}
+    if result["timed_out"]:
+        TIMEOUTS.labels("job").inc()
+    rerun = []
+    for position, index in enumerate(indexes):
+        frame = frames.get(position)
+        if frame is not None:
+            if "seconds" in frame:
+                TEST_RUN_SECONDS.observe(frame["seconds"])
+            if frame.get("timed_out"):
+                TIMEOUTS.labels("test").inc()
+            outcomes[index] = {
+                "success": frame["success"],
+                "output": frame["output"],
+                "error": frame["error"],
+                "usage": frame.get("usage"),
+                "transient": frame.get("timed_out", False)
+            }
+        elif position == stopped:
+            EARLY_MISMATCHES.labels("harness").inc()
+            outcomes[index] = {"success": True, "output": "".join(printed[position]), "error": None,
+                               "mismatch": True, "usage": None}
+        elif stopped is not None and position > stopped:
+            # Never reached: the job was stopped at an earlier test
+            rerun.append(index)
+        elif result["timed_out"]:
+            outcomes[index] = {
+                "success": False,
+                "output": None,
+                "error": f"Execution timeout exceeded ({timeout} seconds)",
+                "transient": True
+            }
+        elif result["output_limited"]:
+            # Wrote past the limit straight to the process's stdout/stderr
+            outcomes[index] = {"success": False, "output": None, "error": output_limit_error(limits)}
+        else:
+            # The sandbox died (e.g. hit a resource limit) before reporting this test
+            outcomes[index] = {
+                "success": False,
+                "output": None,
+                "error": result["stderr"] or f"Sandbox exited with code {result['returncode']}",
+                "transient": True
+            }
+    return rerun
+
+
+def run_preflight(request: "ExecuteRequest") -> Optional[Preflight]:
+    """Static checks on the request's code; None when everything may go to a sandbox"""
+    if not PREFLIGHT_ENABLED:
+        return None
+    tests = [test_case.test for test_case in request.test_cases or ()]
+    with timed(PREFLIGHT_SECONDS, stage="preflight"):
+        checked = preflight(request.code, tests, request.entry_points)
+    preflight_stats["checked"] += 1
+    if checked is None:
+        return None
+
+    kind = checked.summary()["kind"]
+    PREFLIGHT_REJECTIONS.labels(kind).inc()
+    preflight_stats["syntax_errors" if kind == "syntax_error" else "missing_functions"] += 1
+    failed = sum(1 for index in range(len(tests)) if checked.test_error(index))
+    preflight_stats["tests_failed"] += failed
+    # A script is one launch; tests are one harness job with the pool, one process each without
+    if not tests:
+        avoided = 1
+    elif worker_pool is not None:
+        avoided = 1 if failed == len(tests) else 0
+    else:
+        avoided = failed
+    preflight_stats["sandbox_runs_avoided"] += avoided
+    SANDBOX_RUNS_AVOIDED.inc(avoided)
+    return checked
+
+
+def runnable_tests(request: "ExecuteRequest", checked: Optional[Preflight]) -> List[TestCase]:
+    """The request's test cases that passed pre-flight"""
+    if checked is None:
+        return list(request.test_cases or ())
+    return [test_case for index, test_case in enumerate(request.test_cases or ()) if not checked.test_error(index)]
+
+
+def is_fully_cached(request: "ExecuteRequest", checked: Optional[Preflight] = None) -> bool:
+    """True when every outcome the request needs is already cached (no sandbox, no queue slot)"""
+    if request.test_cases:
+        keys = _test_cache_keys(request.code, runnable_tests(request, checked), request.profile)
+    else:
+        keys = [cache_key(CACHE_VERSIONS[request.profile], request.code)]
+    return all(result_cache.peek(key) for key in keys)
 
 
 @app.post("/execute")
-async def execute_code(request: ExecuteRequest):
+async def execute_code(request: ExecuteRequest, http_request: Request):
     """
-    Execute Python code with optional test cases
+    Execute Python code with optional test cases.
+    Callers identify the candidate with X-Client-Id so queued jobs are shared fairly.
     """
+    client_id = http_request.headers.get('X-Client-Id') or (
+        http_request.client.host if http_request.client else 'anonymous'
+    )
+    if request.profile not in SANDBOX_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown sandbox profile: {request.profile}")
+    for test_case in request.test_cases or ():
+        if test_case.comparator not in COMPARATORS:
+            raise HTTPException(status_code=400, detail=f"Unknown comparator: {test_case.comparator}")
+    checked = run_preflight(request)
+    if (checked is not None and checked.fails_everything()) or is_fully_cached(request, checked):
+        return await _execute(request, checked)
+
+    queued_at = time.perf_counter()
+    try:
+        async with scheduler.slot(client_id):
+            waited = time.perf_counter() - queued_at
+            QUEUE_WAIT_SECONDS.observe(waited)
+            record_stage("queue", waited)
+            return await _execute(request, checked)
+    except SchedulerFull as e:
+        REJECTIONS.labels(str(e.status_code)).inc()
+        log.info("Rejected execution for %s: %s", client_id, e.detail,
+                 extra={"event": "scheduler.rejected", "client_id": client_id, "status": e.status_code})
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": "1"})
+
+
+async def _execute(request: ExecuteRequest, checked: Optional[Preflight] = None) -> dict:
     try:
         # If test cases provided, run with test cases
         if request.test_cases and len(request.test_cases) > 0:
             test_results = []
+            runnable = runnable_tests(request, checked)
+            fresh = iter(await run_tests(request.code, runnable, profile=request.profile) if runnable else ())
+            results = []
+            for index in range(len(request.test_cases)):
+                error = checked.test_error(index) if checked else None
+                # Tests that failed pre-flight get its error instead of a sandbox run
+                results.append(next(fresh) if error is None else {"success": False, "output": None,
+                                                                  "error": error["message"]})
 
-            for test_case in request.test_cases:
-                # Combine user code with test case
-                test_code = f"{request.code}\n\n# Test case\n{test_case.test}"
-
-                result = execute_code_safely(test_code)
-
+            for test_case, result in zip(request.test_cases, results):
                 if result["success"]:
                     actual_output = result["output"].strip()
                     expected_output = test_case.expected.strip()
+                    # A test stopped early printed something that can't match
+                    passed = not result.get("mismatch") and output_matches(
+                        result["output"], test_case.expected, test_case.comparator
+                    )
 
                     test_results.append({
-                        "passed": actual_output == expected_output,
+                        "passed": passed,
                         "expected": expected_output,
                         "actual": actual_output,
                         "test_name": test_case.name,
                         "visible": test_case.visible,
-                        "error": None
+                        "error": None,
+                        "usage": result.get("usage")
                     })
                 else:
                     test_results.append({
@@ -139,7 +655,8 @@ async def execute_code(request: ExecuteRequest):
                         "actual": None,
                         "test_name": test_case.name,
                         "visible": test_case.visible,
-                        "error": result["error"]
+                        "error": result["error"],
+                        "usage": result.get("usage")
                     })
 
             passed = sum(1 for r in test_results if r.get("passed", False))
@@ -152,11 +669,20 @@ async def execute_code(request: ExecuteRequest):
                 "total_tests": len(test_results),
                 "passed": passed,
                 "failed": len(test_results) - passed,
-                "test_results": test_results
+                "test_results": test_results,
+                "preflight": checked.summary() if checked else None
             }
         else:
+            if checked is not None:
+                return {
+                    "success": False,
+                    "output": None,
+                    "error": checked.error["message"],
+                    "test_mode": False,
+                    "preflight": checked.error
+                }
             # Run code without test cases
-            result = execute_code_safely(request.code)
+            result = await run_code(request.code, profile=request.profile)
             return {
                 **result,
                 "test_mode": False
@@ -168,4 +694,4 @@ async def execute_code(request: ExecuteRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run(app, host="0.0.0.0", port=8001, access_log=False)
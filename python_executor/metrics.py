@@ -0,0 +1,101 @@
+"""
+Prometheus metrics for the executor, served on /metrics.
+
+Besides the histograms and counters below, every HTTP request collects the
+time it spent in each stage (pre-flight, queue wait, sandbox spawn, sandbox
+run) and returns the breakdown in a Server-Timing header, so a single slow
+request can be attributed to a stage without correlating scrapes.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# From sub-millisecond cache hits up to jobs running into several timeouts
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_SECONDS = Histogram(
+    "executor_http_request_seconds", "HTTP request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "executor_queue_wait_seconds", "Time a job waited for an execution slot", buckets=LATENCY_BUCKETS,
+)
+SANDBOX_SPAWN_SECONDS = Histogram(
+    "executor_sandbox_spawn_seconds", "Time to start a sandbox process (pool: until its ready handshake)",
+    ["kind"], buckets=LATENCY_BUCKETS,
+)
+SANDBOX_RUN_SECONDS = Histogram(
+    "executor_sandbox_run_seconds", "Time a job spent in the sandbox", ["mode"], buckets=LATENCY_BUCKETS,
+)
+TEST_RUN_SECONDS = Histogram(
+    "executor_test_run_seconds", "Run time of a single test case", buckets=LATENCY_BUCKETS,
+)
+TIMEOUTS = Counter("executor_timeouts_total", "Executions stopped by a timeout", ["scope"])
+SANDBOX_FAILURES = Counter("executor_sandbox_failures_total", "Sandboxes that died or failed", ["reason"])
+REJECTIONS = Counter("executor_rejections_total", "Jobs refused by admission control", ["status"])
+CACHE_LOOKUPS = Counter("executor_result_cache_lookups_total", "Result cache lookups", ["result"])
+PREFLIGHT_SECONDS = Histogram(
+    "executor_preflight_seconds", "Time spent on static pre-flight checks", buckets=LATENCY_BUCKETS,
+)
+PREFLIGHT_REJECTIONS = Counter("executor_preflight_rejections_total", "Requests failed by pre-flight checks", ["kind"])
+EARLY_MISMATCHES = Counter(
+    "executor_early_mismatches_total", "Tests stopped as soon as their output could no longer match", ["mode"],
+)
+SANDBOX_RUNS_AVOIDED = Counter("executor_sandbox_runs_avoided_total", "Sandbox launches skipped thanks to pre-flight checks")
+
+# Stage -> seconds for the HTTP request being served (None outside a request)
+_request_stages: ContextVar[Optional[dict]] = ContextVar("request_stages", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Add time to a stage of the current request's Server-Timing breakdown"""
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(histogram, stage: Optional[str] = None, **labels):
+    """Observe the duration of the block, and count it towards a request stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        if stage:
+            record_stage(stage, elapsed)
+
+
+def server_timing(stages: dict, total: float) -> str:
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+
+async def track_requests(request: Request, call_next):
+    """HTTP middleware: request latency by route plus the per-stage Server-Timing header"""
+    stages = {}
+    token = _request_stages.set(stages)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = server_timing(stages, time.perf_counter() - started)
+        return response
+    finally:
+        _request_stages.reset(token)
+        # Route templates rather than raw paths keep label cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,197 @@
+"""
+Pool of warm sandbox workers (see sandbox_worker.py).
+
+Workers are started ahead of demand, handed one job at a time and retired
+after a configurable number of jobs, with a replacement spawned in the
+background so interpreter startup stays off the request path.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+from metrics import SANDBOX_FAILURES, SANDBOX_RUN_SECONDS, SANDBOX_SPAWN_SECONDS, timed
+from sandbox_worker import HEADER
+
+log = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+# Extra time allowed on top of the job timeout before a worker is considered hung
+WORKER_GRACE_SECONDS = 2.0
+
+# Backoff between attempts to spawn a replacement worker: doubles from the first up to the max
+RESPAWN_BACKOFF_SECONDS = 0.5
+RESPAWN_BACKOFF_MAX_SECONDS = 30.0
+
+
+# Called with (test index, text) for each chunk a streaming harness job prints; False stops the job
+OutputCallback = Callable[[int, str], bool]
+
+
+class WorkerError(Exception):
+    """Raised when a worker dies or stops responding"""
+
+
+class Worker:
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.jobs_done = 0
+
+    @classmethod
+    async def spawn(cls) -> "Worker":
+        with timed(SANDBOX_SPAWN_SECONDS, kind="pool"):
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-I", "-B", WORKER_SCRIPT,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            worker = cls(process)
+            try:
+                await worker._read_frame()  # ready handshake
+            except BaseException:
+                if worker.alive:
+                    process.kill()
+                await process.wait()
+                raise
+        return worker
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def _read_frame(self) -> dict:
+        try:
+            header = await self.process.stdout.readexactly(HEADER.size)
+            (length,) = HEADER.unpack(header)
+            return json.loads(await self.process.stdout.readexactly(length))
+        except asyncio.IncompleteReadError:
+            raise WorkerError("Worker exited unexpectedly")
+
+    async def _write_frame(self, message: dict):
+        payload = json.dumps(message).encode()
+        self.process.stdin.write(HEADER.pack(len(payload)) + payload)
+        await self.process.stdin.drain()
+
+    async def run(self, job: dict, on_output: Optional[OutputCallback] = None) -> dict:
+        """
+        Send a job and wait for its result. Output frames streamed before it
+        go to on_output; once that returns False the job is told to stop.
+        """
+        await self._write_frame(job)
+        self.jobs_done += 1
+        deadline = time.monotonic() + job["timeout"] + WORKER_GRACE_SECONDS
+        stopping = False
+        while True:
+            frame = await asyncio.wait_for(self._read_frame(), max(0.0, deadline - time.monotonic()))
+            if "chunk" not in frame:
+                return frame
+            if on_output is not None and not stopping and not on_output(frame["index"], frame["chunk"]):
+                stopping = True
+                await self._write_frame({"stop": True})
+
+    async def stop(self):
+        if not self.alive:
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 1.0)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+
+class WorkerPool:
+    """Fixed-size pool of pre-forked, pre-imported sandbox workers"""
+
+    def __init__(self, size: int, max_jobs_per_worker: int, limits: Optional[Dict] = None):
+        self.size = max(1, size)
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self.limits = limits or {}
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._workers = set()
+        self._refills = set()
+        self._closed = False
+
+    async def start(self):
+        workers = await asyncio.gather(*(Worker.spawn() for _ in range(self.size)))
+        for worker in workers:
+            self._workers.add(worker)
+            self._idle.put_nowait(worker)
+
+    async def stop(self):
+        self._closed = True
+        for task in list(self._refills):
+            task.cancel()
+        await asyncio.gather(*(worker.stop() for worker in list(self._workers)), return_exceptions=True)
+        self._workers.clear()
+
+    async def _replace(self, worker: Worker):
+        self._workers.discard(worker)
+        await worker.stop()
+        # Keep trying: a replacement that is never spawned shrinks the pool for
+        # good, and with one worker every later job would wait forever
+        backoff = RESPAWN_BACKOFF_SECONDS
+        while not self._closed:
+            try:
+                fresh = await Worker.spawn()
+            except Exception as e:
+                SANDBOX_FAILURES.labels("spawn_failed").inc()
+                log.error("Failed to spawn a replacement sandbox worker - %s; retrying in %ss", e, backoff,
+                          extra={"event": "sandbox.spawn_failed"})
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RESPAWN_BACKOFF_MAX_SECONDS)
+                continue
+            if self._closed:
+                await fresh.stop()
+                return
+            self._workers.add(fresh)
+            self._idle.put_nowait(fresh)
+            return
+
+    def _schedule_replace(self, worker: Worker):
+        task = asyncio.create_task(self._replace(worker))
+        self._refills.add(task)
+        task.add_done_callback(self._refills.discard)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "alive": sum(1 for worker in self._workers if worker.alive),
+            "idle": self._idle.qsize(),
+            "refilling": len(self._refills),
+        }
+
+    async def run(self, job: dict, on_output: Optional[OutputCallback] = None) -> dict:
+        """
+        Run a job in a warm worker and return the worker's raw result.
+        The job must carry a "timeout"; pool-wide limits apply unless the job sets its own.
+        A streaming harness job's output goes to on_output (see Worker.run).
+        """
+        job = {"limits": self.limits, **job}
+        worker = await self._idle.get()
+        healthy = False
+        try:
+            with timed(SANDBOX_RUN_SECONDS, stage="sandbox", mode=job.get("mode", "script")):
+                result = await worker.run(job, on_output)
+            healthy = worker.alive and "error" not in result
+            if "error" in result:
+                SANDBOX_FAILURES.labels("worker_error").inc()
+            return result
+        except (asyncio.TimeoutError, WorkerError, BrokenPipeError, ConnectionResetError) as e:
+            reason = "hung" if isinstance(e, asyncio.TimeoutError) else "died"
+            SANDBOX_FAILURES.labels(reason).inc()
+            log.warning("Sandbox worker %s %s; replacing it", worker.process.pid, reason,
+                        extra={"event": "sandbox.failed", "reason": reason})
+            if worker.alive:
+                worker.process.kill()
+            raise WorkerError("Sandbox worker failed")
+        finally:
+            if healthy and worker.jobs_done < self.max_jobs_per_worker:
+                self._idle.put_nowait(worker)
+            else:
+                self._schedule_replace(worker)
@@ -0,0 +1,166 @@
+"""
+Static pre-flight checks on candidate code, run in-process before any sandbox.
+
+A large share of "Run" clicks are code that doesn't compile, or that never
+defines the function the tests call (`twoSum`, `isPalindrome`). Both fail the
+same way in every test, yet each used to cost a sandbox launch first. Here the
+code is compiled once in the executor itself and, if that works, its module
+level names are checked against the functions the tests call. Failures come
+back as structured errors in a few milliseconds; only code that can get past
+them is sent to a sandbox.
+
+The checks only reject code that is certain to fail in the sandbox too.
+Anything they can't be sure about (star imports, names bound through
+strings, very large sources) is left to the sandbox.
+"""
+
+import ast
+import builtins
+import traceback
+import warnings
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Sequence
+
+# Larger sources go straight to a sandbox, where compiling them counts against the job's limits
+PREFLIGHT_MAX_BYTES = 64 * 1024
+
+_BUILTINS = frozenset(dir(builtins))
+
+# Code using any of these can bind names the AST doesn't show
+_DYNAMIC_NAMES = frozenset({"exec", "eval", "globals", "locals", "vars", "setattr", "__import__", "__builtins__"})
+
+
+class Preflight(NamedTuple):
+    error: Optional[dict]       # set when the code can't run at all (syntax error)
+    missing: List[List[str]]    # per test: functions it calls that the code never defines
+
+    def test_error(self, index: int) -> Optional[dict]:
+        """The structured error failing one test, if any"""
+        if self.error:
+            return self.error
+        if self.missing[index]:
+            return missing_functions_error(self.missing[index])
+        return None
+
+    def fails_everything(self) -> bool:
+        """True when no part of the request needs a sandbox"""
+        return self.error is not None or all(self.missing)
+
+    def summary(self) -> dict:
+        """One structured error for the whole request"""
+        if self.error:
+            return self.error
+        return missing_functions_error(sorted({name for names in self.missing for name in names}))
+
+
+def syntax_error(e: SyntaxError) -> dict:
+    return {
+        "kind": "syntax_error",
+        # Same text the sandbox would print for it
+        "message": "".join(traceback.format_exception_only(type(e), e)),
+        "line": e.lineno,
+        "offset": e.offset,
+    }
+
+
+def missing_functions_error(names: Sequence[str]) -> dict:
+    return {
+        "kind": "missing_function",
+        "message": "\n".join(f"NameError: name '{name}' is not defined" for name in names),
+        "names": list(names),
+    }
+
+
+def check_syntax(code: str) -> Optional[dict]:
+    """Compile the code once; the error when it doesn't compile, else None"""
+    try:
+        with warnings.catch_warnings():
+            # SyntaxWarnings belong in the candidate's sandbox output, not the executor's log
+            warnings.simplefilter("ignore")
+            compile(code, "<candidate>", "exec")
+    except SyntaxError as e:
+        return syntax_error(e)
+    except (ValueError, OverflowError, MemoryError, RecursionError):
+        return None  # let the sandbox report it
+    return None
+
+
+def defined_names(code: str) -> Optional[frozenset]:
+    """
+    Every name the code could bind in its module namespace, or None when that
+    can't be told statically (star imports, exec, globals()). Bindings at any
+    depth count, as do identifier-like strings, so a name missing here is
+    certainly missing.
+    """
+    try:
+        tree = ast.parse(code, "<candidate>")
+    except (SyntaxError, ValueError, OverflowError, MemoryError, RecursionError):
+        return None
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Name):
+            if node.id in _DYNAMIC_NAMES:
+                return None
+            if not isinstance(node.ctx, ast.Load):
+                names.add(node.id)
+        elif isinstance(node, ast.alias):
+            if node.name == "*":
+                return None
+            names.add(node.asname or node.name.split(".")[0])
+        elif isinstance(node, ast.Global):
+            names.update(node.names)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.isidentifier():
+            names.add(node.value)
+        elif hasattr(ast, "MatchAs") and isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif hasattr(ast, "MatchMapping") and isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return frozenset(names)
+
+
+@lru_cache(maxsize=1024)
+def called_functions(test: str) -> frozenset:
+    """Non-builtin names a test snippet calls without defining them itself (hidden tests repeat, so cached)"""
+    try:
+        tree = ast.parse(test)
+    except (SyntaxError, ValueError, OverflowError, MemoryError, RecursionError):
+        return frozenset()
+    called = set()
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            called.add(node.func.id)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.alias):
+            bound.add(node.asname or node.name.split(".")[0])
+    return frozenset(called - bound - _BUILTINS)
+
+
+def preflight(code: str, tests: Sequence[str], entry_points: Optional[Sequence[str]] = None) -> Optional[Preflight]:
+    """
+    Check code before it is sent to a sandbox. entry_points are functions the
+    code must define; without them they are inferred per test from the calls
+    it makes. Returns None when the code passes (or is too large to check).
+    """
+    if len(code) > PREFLIGHT_MAX_BYTES:
+        return None
+
+    error = check_syntax(code)
+    if error:
+        return Preflight(error, [[] for _ in tests])
+
+    required = [sorted(entry_points) if entry_points else sorted(called_functions(test)) for test in tests]
+    if not any(required):
+        return None
+    names = defined_names(code)
+    if names is None:
+        return None
+    missing = [[name for name in needed if name not in names] for needed in required]
+    if not any(missing):
+        return None
+    return Preflight(None, missing)
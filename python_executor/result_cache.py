@@ -0,0 +1,97 @@
+"""
+Content-addressed cache of execution outcomes.
+
+Candidates press "Run" repeatedly on unchanged code, and submitting re-runs
+the same code against the same test snippets. Outcomes are keyed by a hash of
+the normalized code, the test snippet and the executor version (which covers
+anything else that can change an outcome, like timeouts and sandbox limits),
+so a repeat run returns without touching a sandbox.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_code(code: str) -> str:
+    """Normalize differences that can't change behaviour (line endings, trailing blank space)"""
+    return code.replace("\r\n", "\n").replace("\r", "\n").rstrip() + "\n"
+
+
+def cache_key(version: str, code: str, test: Optional[str] = None) -> str:
+    digest = hashlib.sha256()
+    for part in (version, normalize_code(code), test if test is not None else "\0script"):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU cache with a TTL and a cap on the total size of stored outcomes"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def peek(self, key: str) -> bool:
+        """Check for a live entry without touching stats or LRU order"""
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() < entry[2]
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, _, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def put(self, key: str, value: dict):
+        size = len(key) + len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (dict(value), size, time.monotonic() + self.ttl_seconds)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
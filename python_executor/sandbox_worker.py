@@ -0,0 +1,652 @@
+"""
+Warm sandbox worker for the Python executor.
+
+Each worker is a long-lived interpreter started by WorkerPool. It pre-imports
+the modules candidates commonly use, then waits for jobs on stdin. Every job
+runs in a freshly forked child with its own resource limits, so no state
+leaks between candidates and the interpreter startup cost is paid once per
+worker instead of once per test case.
+
+Jobs come in two modes:
+- "script": run the code like `python file.py` and return its stdout/stderr
+- "harness": compile the code once, then run every test snippet in the same
+  child with its own stdout capture, timeout and exception isolation. Each
+  test after the first re-runs the module in a fresh namespace, so state a
+  test leaves in module-level globals can't change the next one's result. Each
+  test's outcome is framed back as soon as it finishes, so a test that hangs
+  past the job deadline doesn't lose the results of the ones before it.
+  With "stream" set, what each test prints is also framed back as it is
+  printed, so the executor can stop the job as soon as a test's output can
+  no longer match. Expected outputs never enter the sandbox: candidate code
+  could read anything in the memory it was forked from.
+
+Each job carries its sandbox profile's limits: CPU seconds, address space,
+file size, open files, whether it may start processes, and how much output
+is kept. Output past the limit stops the job instead of piling up in the
+executor's memory. Results report the CPU time and peak RSS used; per test
+in harness mode, CPU time is the test's own and peak RSS is the job's so far.
+
+Started with --script, it instead runs the code piped on stdin once and exits.
+
+Protocol: length-prefixed (4-byte big-endian) JSON frames on stdin/stdout.
+While a job runs, the worker may send {"index", "chunk"} output frames before
+its result, and the executor may send {"stop": true} to end the job early.
+"""
+
+import ast
+import contextlib
+import io
+import json
+import math
+import os
+import re
+import resource
+import selectors
+import signal
+import struct
+import sys
+import time
+import traceback
+from collections import OrderedDict
+
+# Modules pre-imported so forked children get them for free
+PRELOAD_MODULES = [
+    "bisect", "collections", "copy", "functools", "heapq", "itertools",
+    "json", "math", "random", "re", "string", "typing",
+]
+
+HEADER = struct.Struct(">I")
+
+# Code objects by source. The worker compiles a job's code and test snippets
+# before forking, so the child starts from ready bytecode; the same hidden
+# tests (and resubmitted code) are then compiled once per worker, not per job.
+COMPILE_CACHE_SIZE = 512
+# Larger sources are left to the child, where compiling them counts against the job's limits
+PRECOMPILE_MAX_BYTES = 64 * 1024
+_compiled = OrderedDict()
+
+
+def _read_exactly(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_frame(stream):
+    """Read one length-prefixed JSON frame, or None on EOF"""
+    header = _read_exactly(stream, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    payload = _read_exactly(stream, length)
+    return json.loads(payload) if payload is not None else None
+
+
+def write_frame(stream, message):
+    """Write one length-prefixed JSON frame"""
+    payload = json.dumps(message).encode()
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def split_frames(buffer):
+    """Decode all complete frames in a byte buffer; returns (frames, bytes consumed)"""
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= HEADER.size:
+        (length,) = HEADER.unpack_from(buffer, offset)
+        start = offset + HEADER.size
+        if len(buffer) - start < length:
+            break
+        frames.append(json.loads(buffer[start:start + length]))
+        offset = start + length
+    return frames, offset
+
+
+def compiled(source):
+    """Compile candidate source (or a test snippet), reusing the cached code object"""
+    code = _compiled.get(source)
+    if code is not None:
+        _compiled.move_to_end(source)
+        return code
+    code = compile(source, "<candidate>", "exec")
+    _compiled[source] = code
+    if len(_compiled) > COMPILE_CACHE_SIZE:
+        _compiled.popitem(last=False)
+    return code
+
+
+def precompile(job):
+    """Fill the compile cache for a job; sources that don't compile fail later, in the child"""
+    for source in (job.get("code", ""), *job.get("tests", ())):
+        if len(source) > PRECOMPILE_MAX_BYTES:
+            continue
+        try:
+            compiled(source)
+        except (SyntaxError, ValueError, OverflowError, MemoryError, RecursionError):
+            pass
+
+
+def apply_limits(limits):
+    """Apply per-job rlimits inside the forked child"""
+    cpu_seconds = limits.get("cpu_seconds")
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+
+    memory_mb = limits.get("memory_mb")
+    if memory_mb:
+        memory_bytes = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+    max_file_mb = limits.get("max_file_mb")
+    if max_file_mb is not None:
+        file_bytes = max_file_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_bytes, file_bytes))
+
+    max_open_files = limits.get("max_open_files")
+    if max_open_files:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max_open_files, max_open_files))
+
+    # No fork/clone at all (subprocesses, threads). Not enforced for root.
+    if limits.get("allow_subprocesses") is False:
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def max_output_bytes(limits):
+    """Output kept per stream (script mode) or per test (harness mode); None means unbounded"""
+    max_output_kb = limits.get("max_output_kb")
+    return max_output_kb * 1024 if max_output_kb else None
+
+
+def usage_since(before):
+    """
+    CPU time since `before`, from RUSAGE_SELF. Peak RSS can't be reset within
+    a process, so it is the job's sandbox peak so far (tests before this one
+    included), reported as job_peak_rss_kb rather than as this test's own.
+    """
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+    return {"cpu_ms": round(cpu * 1000, 1), "job_peak_rss_kb": after.ru_maxrss}
+
+
+def own_usage():
+    """CPU time and peak RSS of this whole process"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {"cpu_ms": round((usage.ru_utime + usage.ru_stime) * 1000, 1), "peak_rss_kb": usage.ru_maxrss}
+
+
+class TestTimeout(BaseException):
+    """Raised inside a harness test when its time budget runs out"""
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised inside a harness test when it prints more than its output limit"""
+
+
+# Output comparators, used by the executor (never inside a sandbox). Each
+# test names one ("exact" unless set); the final verdict comes from
+# output_matches, and while a test runs a StreamingCheck fed its streamed
+# output tells when it can no longer match, or has run more than a slack
+# past the expected size in bytes, so the job can be stopped there.
+
+def _stripped_equal(actual, expected):
+    return actual.strip() == expected.strip()
+
+
+def _tokens_equal(actual, expected):
+    return actual.split() == expected.split()
+
+
+_FLOAT_TOKEN = re.compile(r"[^\s\[\](){},;]+|[\[\](){},;]")
+
+# Longest repr() of a float ("-2.2250738585072014e-308")
+_FLOAT_REPR_BYTES = 24
+
+
+def _float_equal(a, b):
+    try:
+        return math.isclose(float(a), float(b), rel_tol=1e-6, abs_tol=1e-9)
+    except ValueError:
+        return a == b
+
+
+def _floats_equal(actual, expected):
+    actual_tokens = _FLOAT_TOKEN.findall(actual)
+    expected_tokens = _FLOAT_TOKEN.findall(expected)
+    return len(actual_tokens) == len(expected_tokens) and all(map(_float_equal, actual_tokens, expected_tokens))
+
+
+def _unordered_equal(actual, expected):
+    """Same elements in any order for list/tuple/set literals (Two Sum's indices); otherwise exact"""
+    try:
+        actual_value = ast.literal_eval(actual.strip())
+        expected_value = ast.literal_eval(expected.strip())
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return _stripped_equal(actual, expected)
+    sequences = (list, tuple, set, frozenset)
+    if isinstance(actual_value, sequences) and isinstance(expected_value, sequences):
+        return sorted(map(repr, actual_value)) == sorted(map(repr, expected_value))
+    return actual_value == expected_value
+
+
+COMPARATORS = {
+    "exact": _stripped_equal,         # equal once leading/trailing whitespace is stripped
+    "whitespace": _tokens_equal,      # equal as whitespace-separated tokens
+    "float": _floats_equal,           # numbers within a relative tolerance of 1e-6
+    "unordered": _unordered_equal,    # list literals with the same elements in any order
+}
+
+
+def output_matches(actual, expected, comparator="exact"):
+    return COMPARATORS[comparator](actual, expected)
+
+
+class _PrefixCheck:
+    """exact: stripped output must follow the stripped expected output, then only whitespace"""
+
+    def __init__(self, expected):
+        self.expected = expected.strip()
+        self.position = 0
+        self.started = False
+
+    def feed(self, text):
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return True
+            self.started = True
+        take = min(len(text), len(self.expected) - self.position)
+        if text[:take] != self.expected[self.position:self.position + take]:
+            return False
+        self.position += take
+        return not text[take:] or text[take:].isspace()
+
+
+class _TokenCheck:
+    """whitespace/float: each completed token must match the expected token at its position"""
+
+    def __init__(self, expected, pattern, equal, delimiters=frozenset(), check_partial=True):
+        self.pattern = pattern
+        self.equal = equal
+        self.delimiters = delimiters
+        self.check_partial = check_partial
+        self.expected = pattern.findall(expected)
+        self.index = 0
+        self.partial = ""
+
+    def feed(self, text):
+        data = self.partial + text
+        tokens = [match.group() for match in self.pattern.finditer(data)]
+        # A token running up to the end of the data may still be growing
+        self.partial = ""
+        if tokens and not data[-1].isspace() and tokens[-1] not in self.delimiters:
+            self.partial = tokens.pop()
+        for token in tokens:
+            if self.index >= len(self.expected) or not self.equal(token, self.expected[self.index]):
+                return False
+            self.index += 1
+        if self.partial:
+            if self.index >= len(self.expected):
+                return False
+            if self.check_partial and not self.expected[self.index].startswith(self.partial):
+                return False
+        return True
+
+
+class _LengthCheck:
+    """unordered: nothing to judge before the output is complete, only its length"""
+
+    def feed(self, text):
+        return True
+
+
+class StreamingCheck:
+    """Feeds output as it is produced; False once it can no longer match (or runs far too long)"""
+
+    def __init__(self, expected, comparator="exact", slack=1024):
+        self.limit = len(expected.encode()) + slack
+        self.size = 0
+        self.diverged = False
+        if comparator == "exact":
+            self.check = _PrefixCheck(expected)
+        elif comparator == "whitespace":
+            self.check = _TokenCheck(expected, re.compile(r"\S+"), str.__eq__)
+        elif comparator == "float":
+            # A partial number can't be judged ("0.1" may become "0.1000001")
+            self.check = _TokenCheck(expected, _FLOAT_TOKEN, _float_equal, frozenset("[](){},;"),
+                                     check_partial=False)
+            # A matching number may be printed much longer than expected ("0.3" as
+            # "0.30000000000000004"), so each one gets room for a full float repr
+            self.limit += _FLOAT_REPR_BYTES * len(_FLOAT_TOKEN.findall(expected))
+        else:
+            self.check = _LengthCheck()
+
+    def feed(self, text):
+        if not self.diverged:
+            self.size += len(text.encode(errors="replace"))
+            self.diverged = self.size > self.limit or not self.check.feed(text)
+        return not self.diverged
+
+
+class BoundedBuffer(io.StringIO):
+    """stdout capture that stops the test once it holds max_chars characters"""
+
+    def __init__(self, max_chars):
+        super().__init__()
+        self.max_chars = max_chars
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+        if self.max_chars is not None and self.size > self.max_chars:
+            raise OutputLimitExceeded()
+        return super().write(text)
+
+
+class StreamingBuffer(BoundedBuffer):
+    """BoundedBuffer that also frames every write back to the worker as it happens"""
+
+    def __init__(self, max_chars, result_stream, index):
+        super().__init__(max_chars)
+        self.result_stream = result_stream
+        self.index = index
+
+    def write(self, text):
+        written = super().write(text)
+        if text:
+            write_frame(self.result_stream, {"index": self.index, "chunk": text})
+        return written
+
+
+def _raise_test_timeout(signum, frame):
+    raise TestTimeout()
+
+
+def candidate_traceback(e):
+    """The part of a traceback that starts at the candidate's code"""
+    if isinstance(e, SyntaxError) and e.filename == "<candidate>":
+        return None  # raised by compiling it: no frame of theirs to show
+    return e.__traceback__.tb_next
+
+
+def format_exception(e):
+    """Format a traceback starting at the candidate's code"""
+    return "".join(traceback.format_exception(type(e), e, candidate_traceback(e)))
+
+
+def exec_captured(sources, namespace, timeout, max_output=None, buffer=None):
+    """Exec sources in turn with bounded captured stdout (buffer) and one wall-clock timer"""
+    buffer = buffer or BoundedBuffer(max_output)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with contextlib.redirect_stdout(buffer):
+            for source in sources:
+                exec(compiled(source), namespace)
+    except TestTimeout:
+        return {"success": False, "output": None, "timed_out": True,
+                "error": f"Execution timeout exceeded ({timeout} seconds)"}
+    except OutputLimitExceeded:
+        return {"success": False, "output": None, "output_limited": True,
+                "error": f"Output limit exceeded ({max_output // 1024} KB)"}
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            return {"success": False, "output": None, "error": str(e.code)}
+    except BaseException as e:
+        return {"success": False, "output": None, "error": format_exception(e)}
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    return {"success": True, "output": buffer.getvalue(), "error": None}
+
+
+def run_script(code):
+    """Run candidate code like `python file.py`, returning the exit code"""
+    try:
+        exec(compiled(code), {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            return e.code
+        if e.code is not None:
+            print(e.code, file=sys.stderr)
+            return 1
+    except BaseException as e:
+        # Skip this frame so the traceback starts at the candidate's code
+        traceback.print_exception(type(e), e, candidate_traceback(e))
+        return 1
+    return 0
+
+
+def run_harness(code, tests, timeout, result_stream, max_output=None, stream=False):
+    """
+    Load candidate code and run each test snippet against it. With stream,
+    what each test prints is also framed back as it is printed.
+    """
+    signal.signal(signal.SIGALRM, _raise_test_timeout)
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    loaded = exec_captured((code,), namespace, timeout, max_output)
+    # Module-level prints were part of every test's output when each test
+    # re-ran the whole program, so keep prefixing them
+    preamble = loaded["output"] or ""
+
+    for index, test in enumerate(tests):
+        if not loaded["success"]:
+            outcome = dict(loaded)
+        else:
+            buffer = StreamingBuffer(max_output, result_stream, index) if stream else BoundedBuffer(max_output)
+            if index == 0:
+                # The first test runs against the namespace as loaded
+                sources, prefix = (test,), preamble
+                if stream and preamble:
+                    write_frame(result_stream, {"index": 0, "chunk": preamble})
+            else:
+                # Later tests re-run the (already compiled) module in a fresh
+                # namespace. A copy of the loaded one wouldn't do: functions keep
+                # __globals__ bound to the namespace they were defined in, so
+                # module-level state (a list appended to on every call) would
+                # carry over from test to test, unlike in cold mode.
+                namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+                sources, prefix = (code, test), ""
+            started = time.perf_counter()
+            before = resource.getrusage(resource.RUSAGE_SELF)
+            outcome = exec_captured(sources, namespace, timeout, max_output, buffer)
+            outcome["usage"] = usage_since(before)
+            outcome["seconds"] = time.perf_counter() - started
+            if outcome["success"]:
+                outcome["output"] = prefix + outcome["output"]
+        write_frame(result_stream, {"index": index, **outcome})
+    return 0
+
+
+def run_child(job, out_fd, err_fd, result_fd, proto_fds):
+    """Body of the forked child"""
+    exit_code = 0
+    try:
+        os.setsid()
+        for fd in proto_fds:
+            os.close(fd)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        os.close(out_fd)
+        os.close(err_fd)
+        limits = job.get("limits", {})
+        apply_limits(limits)
+
+        if job.get("mode") == "harness":
+            with os.fdopen(result_fd, "wb") as result_stream:
+                exit_code = run_harness(job["code"], job["tests"], job.get("test_timeout", 5), result_stream,
+                                        max_output_bytes(limits), job.get("stream", False))
+        else:
+            os.close(result_fd)
+            exit_code = run_script(job["code"])
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def run_job(job, proto_fds, control=None, forward=None):
+    """
+    Fork a child for one job and collect its output and exit status. Output
+    frames from a streaming harness go to forward as they arrive; a stop
+    frame read from control (the executor's channel) ends the job early.
+    """
+    timeout = job.get("timeout", 5)
+    precompile(job)
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    result_r, result_w = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        os.close(result_r)
+        run_child(job, out_w, err_w, result_w, proto_fds)
+
+    os.close(out_w)
+    os.close(err_w)
+    os.close(result_w)
+
+    deadline = time.monotonic() + timeout
+    chunks = {out_r: [], err_r: []}
+    results = bytearray()
+    tests = []
+    # Bytes kept per output stream; the job is stopped once one reaches the limit
+    max_output = max_output_bytes(job.get("limits", {}))
+    kept = {out_r: 0, err_r: 0}
+    timed_out = False
+    output_limited = False
+    stop_requested = False
+    open_pipes = {out_r, err_r, result_r}
+
+    with selectors.DefaultSelector() as selector:
+        for fd in open_pipes:
+            selector.register(fd, selectors.EVENT_READ)
+        if control is not None:
+            selector.register(control, selectors.EVENT_READ)
+        while open_pipes and not (output_limited or stop_requested):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                if key.fileobj is control:
+                    message = read_frame(control)
+                    if message is None:
+                        selector.unregister(control)  # the executor went away; finish the job anyway
+                    elif message.get("stop"):
+                        stop_requested = True
+                    continue
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fd)
+                    open_pipes.discard(key.fd)
+                    continue
+                if key.fd == result_r:
+                    results += data
+                    frames, consumed = split_frames(results)
+                    del results[:consumed]
+                    for frame in frames:
+                        if "chunk" not in frame:
+                            tests.append(frame)
+                        elif forward is not None:
+                            forward(frame)
+                    continue
+                if max_output is not None:
+                    room = max_output - kept[key.fd]
+                    if len(data) > room:
+                        data = data[:room]
+                        output_limited = True
+                    kept[key.fd] += len(data)
+                chunks[key.fd].append(data)
+
+    # The child may have closed its pipes but still be running
+    status = rusage = None
+    stopped = timed_out or output_limited or stop_requested
+    while not stopped:
+        waited_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+        if waited_pid:
+            break
+        if time.monotonic() >= deadline:
+            timed_out = stopped = True
+            break
+        time.sleep(0.005)
+
+    if stopped:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        _, status, rusage = os.wait4(pid, 0)
+
+    os.close(out_r)
+    os.close(err_r)
+    os.close(result_r)
+
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "stdout": b"".join(chunks[out_r]).decode(errors="replace"),
+        "stderr": b"".join(chunks[err_r]).decode(errors="replace"),
+        "timed_out": timed_out,
+        "output_limited": output_limited,
+        "stopped": stop_requested,
+        "usage": {
+            "cpu_ms": round((rusage.ru_utime + rusage.ru_stime) * 1000, 1),
+            "peak_rss_kb": rusage.ru_maxrss,
+        },
+        "tests": tests,
+    }
+
+
+def main():
+    if sys.argv[1:2] == ["--script"]:
+        # One-off run of code piped on stdin (the executor's fallback without a worker pool),
+        # reporting its usage on the fd given with --usage-fd as it exits
+        exit_code = run_script(sys.stdin.read())
+        if sys.argv[2:3] == ["--usage-fd"]:
+            try:
+                os.write(int(sys.argv[3]), json.dumps(own_usage()).encode())
+            except OSError:
+                pass
+        sys.exit(exit_code)
+
+    for name in PRELOAD_MODULES:
+        __import__(name)
+
+    # Move the protocol channel off fds 0/1 so stray writes can't corrupt it
+    proto_in_fd = os.dup(0)
+    proto_out_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    # Unbuffered: stop frames are also read straight off it while a job runs
+    proto_in = os.fdopen(proto_in_fd, "rb", buffering=0)
+    proto_out = os.fdopen(proto_out_fd, "wb")
+    proto_fds = (proto_in_fd, proto_out_fd)
+
+    write_frame(proto_out, {"ready": True, "pid": os.getpid()})
+
+    while True:
+        job = read_frame(proto_in)
+        if job is None:
+            break
+        if job.get("stop"):
+            continue  # sent as the previous job was finishing
+        try:
+            result = run_job(job, proto_fds, proto_in, lambda frame: write_frame(proto_out, frame))
+        except Exception as e:
+            result = {"returncode": None, "stdout": "", "stderr": "", "timed_out": False,
+                      "error": f"Worker error: {str(e)}"}
+        write_frame(proto_out, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Admission control and fair scheduling for code execution.
+
+At most `max_concurrent` executions run at once. Everything else waits in a
+bounded admission queue, and waiting jobs are granted slots round-robin
+across clients so a candidate with many queued jobs (e.g. a full submit)
+can't starve other candidates' "Run" clicks.
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+
+class SchedulerFull(Exception):
+    """Raised when a job can't be admitted; carries the HTTP status to return"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class FairScheduler:
+    def __init__(self, max_concurrent: int, max_queue: int, max_queue_per_client: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.running = 0
+        self.queued = 0
+        # client_id -> deque of waiting futures, in round-robin order
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "waiting_clients": len(self._waiting),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+    def _admit(self, client_id: str) -> asyncio.Future:
+        if self.queued >= self.max_queue:
+            raise SchedulerFull(503, "Executor is at capacity, please retry shortly")
+        client_queue = self._waiting.get(client_id)
+        if client_queue is not None and len(client_queue) >= self.max_queue_per_client:
+            raise SchedulerFull(429, "Too many pending executions for this client")
+
+        future = asyncio.get_running_loop().create_future()
+        if client_queue is None:
+            client_queue = self._waiting[client_id] = deque()
+        client_queue.append(future)
+        self.queued += 1
+        return future
+
+    def _dispatch(self):
+        """Grant free slots to waiting clients in round-robin order"""
+        while self.running < self.max_concurrent and self._waiting:
+            client_id, client_queue = self._waiting.popitem(last=False)
+            future = client_queue.popleft()
+            if client_queue:
+                # Move the client to the back of the rotation
+                self._waiting[client_id] = client_queue
+            self.queued -= 1
+            self.running += 1
+            future.set_result(None)
+
+    def _withdraw(self, client_id: str, future: asyncio.Future):
+        client_queue = self._waiting.get(client_id)
+        if client_queue is None or future not in client_queue:
+            return False
+        client_queue.remove(future)
+        if not client_queue:
+            del self._waiting[client_id]
+        self.queued -= 1
+        return True
+
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        """Wait for an execution slot; raises SchedulerFull if the queue is full"""
+        future = self._admit(client_id)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot was granted just as the waiter went away: give it back
+            if not self._withdraw(client_id, future):
+                self.running -= 1
+                self._dispatch()
+            raise
+
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._dispatch()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Bulk re-grading of stored submissions
+
+Streams submissions out of the results database in primary-key order,
+re-scores them against the current exam definitions (backend/exams) and
+writes the new scores back one batch per transaction. Submissions are scored
+across a process pool; their Python code is re-run on the executor service
+(PYTHON_EXECUTOR_URL), sandboxed and limited exactly as when it was submitted.
+Candidate code never runs on this host.
+
+Progress is checkpointed after every written batch, so an interrupted run
+picks up where it stopped when started again with the same filters; the
+checkpoint is removed once a run completes. The backend's cohort analytics
+pick up the new scores on POST /api/analytics/rebuild (or its next restart).
+
+Usage: python regrade.py [--exam default] [--workers 8] [--batch-size 200] [--executor-url URL] [--fresh] [--dry-run]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timezone
+from typing import Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from db import connect  # noqa: E402
+from question_bank import QuestionBank  # noqa: E402
+from submission_store import REGRADE_PYTHON_RESULT, REGRADE_SUBMISSION, write_batch  # noqa: E402
+
+RESULTS_CONFIG = {
+    'port': int(os.getenv('MYSQL_PORT', 3306)),
+    'user': os.getenv('MYSQL_USER', 'techuser'),
+    'password': os.getenv('MYSQL_PASSWORD', 'techpass'),
+    'database': os.getenv('SUBMISSIONS_DATABASE', 'techassess_results'),
+}
+
+PYTHON_EXECUTOR_URL = os.getenv('PYTHON_EXECUTOR_URL', 'http://localhost:8001')
+
+SELECT_SUBMISSIONS = """
+    SELECT id, exam_id, exam_version, candidate_name, candidate_email, mcq_score, sql_score, python_score,
+           total_score, tab_switch_count, violation_flag, answers, submitted_at
+    FROM submissions
+    WHERE id > %s {exam_filter}
+    ORDER BY id
+    LIMIT %s
+"""
+
+SELECT_CODE = "SELECT submission_id, problem_id, code FROM submission_python_results WHERE submission_id IN ({})"
+
+# Compiled exams of this worker process (MappingProxy-based exams don't pickle, so each worker loads its own)
+_question_bank = None
+# This worker's connection to the executor service
+_executor = None
+
+
+def stream_submissions(connection, after_id: str, exam_id: str, batch_size: int):
+    """Yield batches of stored submissions with their Python code, in ID order after after_id"""
+    exam_filter = "AND exam_id = %s" if exam_id else ""
+    while True:
+        with connection.cursor() as cursor:
+            params = (after_id, exam_id, batch_size) if exam_id else (after_id, batch_size)
+            cursor.execute(SELECT_SUBMISSIONS.format(exam_filter=exam_filter), params)
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            cursor.execute(SELECT_CODE.format(", ".join(["%s"] * len(rows))), [row["id"] for row in rows])
+            code = {}
+            for row in cursor.fetchall():
+                code.setdefault(row["submission_id"], {})[row["problem_id"]] = row["code"]
+
+        batch = []
+        for row in rows:
+            answers = json.loads(row["answers"] or "{}")
+            batch.append({
+                **row,
+                "answers": answers,
+                "python_code": code.get(row["id"], {}),
+                "timestamp": row["submitted_at"].replace(tzinfo=timezone.utc).timestamp(),
+            })
+        yield batch
+        after_id = rows[-1]["id"]
+
+
+def _init_worker(exam_dir: str, executor_url: str, request_timeout: float):
+    global _question_bank, _executor
+    _question_bank = QuestionBank(exam_dir, "default", reload_seconds=0)
+    _question_bank.load()
+    _executor = httpx.Client(base_url=executor_url, timeout=request_timeout)
+
+
+def grade_python(code: str, tests: tuple, points: float) -> dict:
+    """
+    Run one problem's tests on the executor and score it like the backend does.
+    A failed request raises (httpx.HTTPError) rather than scoring the problem 0.
+    """
+    response = _executor.post(
+        "/execute",
+        json={"code": code, "test_cases": list(tests)},
+        # One client per pool worker, so the executor shares its queue between them and live candidates
+        headers={"X-Client-Id": f"regrade-{os.getpid()}"},
+    )
+    response.raise_for_status()
+    outcomes = [bool(test_result.get("passed")) for test_result in response.json().get("test_results", [])]
+    passed = sum(outcomes)
+    return {
+        "passed": passed,
+        "total": len(tests),
+        "points": round(passed * points / len(tests), 2),
+        "tests": outcomes,
+    }
+
+
+def regrade(record: dict) -> Optional[dict]:
+    """
+    Re-score one stored submission against the current version of its exam
+    (runs in a pool worker); None when that exam no longer exists
+    """
+    try:
+        exam = _question_bank.get(record["exam_id"])
+    except KeyError:
+        return None
+    answers = record["answers"]
+    mcq_score = exam.score_mcq({int(q_id): answer for q_id, answer in answers.get("mcq", {}).items()})
+    sql_score = exam.score_sql({int(q_id): answer for q_id, answer in answers.get("sql", {}).items()})
+
+    python_results = {}
+    python_test_outcomes = {}
+    for problem_id, code in record["python_code"].items():
+        problem = exam.python_problems.get(problem_id)
+        if not code or not code.strip():
+            python_results[problem_id] = {"passed": 0, "total": 0, "points": 0}
+        elif problem and problem.tests:
+            python_results[problem_id] = grade_python(code, problem.tests, problem.points)
+            python_test_outcomes[problem_id] = python_results[problem_id].pop("tests")
+    python_score = round(sum(result["points"] for result in python_results.values()))
+
+    return {
+        **record,
+        "exam_version": exam.version,
+        "mcq_score": mcq_score,
+        "sql_score": sql_score,
+        "python_score": python_score,
+        "python_results": python_results,
+        "python_test_outcomes": python_test_outcomes,
+        "total_score": mcq_score + sql_score + python_score,
+        "max_score": exam.max_score,
+    }
+
+
+def load_checkpoint(path: str, exam_id: str) -> dict:
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if checkpoint.get("exam_id") != exam_id:
+        print(f"[!] Ignoring checkpoint {path}: it was written for exam {checkpoint.get('exam_id')!r}")
+        return {}
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Write the checkpoint atomically (a crash leaves the old or the new one, never half of each)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--exam", help="Only re-grade submissions of this exam")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--executor-url", default=PYTHON_EXECUTOR_URL)
+    parser.add_argument("--request-timeout", type=float, default=120.0,
+                        help="Seconds to wait for the executor to run one problem's tests")
+    parser.add_argument("--exams-dir", default=os.getenv('QUESTION_BANK_DIR', os.path.join(ROOT, "backend", "exams")))
+    parser.add_argument("--checkpoint", default="regrade.checkpoint.json")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--dry-run", action="store_true", help="Re-score but don't write anything back")
+    args = parser.parse_args()
+
+    checkpoint = {} if args.fresh else load_checkpoint(args.checkpoint, args.exam)
+    if checkpoint:
+        print(f"[*] Resuming after submission {checkpoint['last_id']} ({checkpoint['regraded']} already re-graded)")
+    checkpoint = {"exam_id": args.exam, "last_id": "", "regraded": 0, "changed": 0, "skipped": 0, **checkpoint}
+
+    # Spawned rather than forked: workers start clean, without the database connection or anything else of ours
+    pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker,
+                               initargs=(args.exams_dir, args.executor_url, args.request_timeout))
+    connection = connect(RESULTS_CONFIG)
+    started = time.perf_counter()
+    regraded = 0
+    try:
+        with pool:
+            for batch in stream_submissions(connection, checkpoint["last_id"], args.exam, args.batch_size):
+                regraded_batch = pool.map(regrade, batch, chunksize=max(1, len(batch) // (args.workers * 4)))
+                pairs = []
+                for old, new in zip(batch, regraded_batch):
+                    if new is None:
+                        print(f"[!] Skipping submission {old['id']}: exam {old['exam_id']!r} no longer exists")
+                    else:
+                        pairs.append((old, new))
+                results = [new for _, new in pairs]
+                changed = sum(1 for old, new in pairs if old["total_score"] != new["total_score"])
+                if results and not args.dry_run:
+                    write_batch(connection, results, REGRADE_SUBMISSION, REGRADE_PYTHON_RESULT)
+
+                regraded += len(results)
+                checkpoint.update(
+                    last_id=batch[-1]["id"],
+                    regraded=checkpoint["regraded"] + len(results),
+                    changed=checkpoint["changed"] + changed,
+                    skipped=checkpoint["skipped"] + len(batch) - len(results),
+                )
+                if not args.dry_run:
+                    save_checkpoint(args.checkpoint, checkpoint)
+
+                elapsed = time.perf_counter() - started
+                print(f"[+] {checkpoint['regraded']} re-graded, {checkpoint['changed']} changed score "
+                      f"({regraded / elapsed:.1f} submissions/s)")
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted; run again to resume from the last checkpoint")
+        sys.exit(130)
+    except httpx.HTTPError as e:
+        print(f"\n[!] Executor request failed ({e}); run again to resume from the last checkpoint")
+        sys.exit(1)
+    finally:
+        connection.close()
+
+    # A finished run starts from scratch next time (a dry run never wrote the checkpoint it resumed from)
+    if not args.dry_run and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    elapsed = time.perf_counter() - started
+    print(f"\n[+] Done: {regraded} submissions in {elapsed:.1f}s "
+          f"({regraded / elapsed if elapsed else 0:.1f} submissions/s), "
+          f"{checkpoint['changed']} total score change(s), {checkpoint['skipped']} skipped (exam no longer exists)"
+          f"{' (dry run)' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
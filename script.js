@@ -497,19 +497,22 @@ const pythonTestCases = {
             name: 'Test Case 1 (Visible)',
             test: 'print(twoSum([2, 7, 11, 15], 9))',
             expected: '[0, 1]',
-            visible: true
+            visible: true,
+            comparator: 'unordered'
         },
         {
             name: 'Test Case 2 (Hidden)',
             test: 'print(twoSum([3, 2, 4], 6))',
             expected: '[1, 2]',
-            visible: false
+            visible: false,
+            comparator: 'unordered'
         },
         {
             name: 'Test Case 3 (Hidden)',
             test: 'print(twoSum([3, 3], 6))',
             expected: '[0, 1]',
-            visible: false
+            visible: false,
+            comparator: 'unordered'
         }
     ],
     2: [ // Palindrome problem
@@ -704,7 +707,8 @@ async function runSQLQuery(questionNum) {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                query: query
+                query: query,
+                stream: true
             })
         });
 
@@ -712,7 +716,11 @@ async function runSQLQuery(questionNum) {
             throw new Error('Backend server error');
         }
 
-        const result = await response.json();
+        // Streamed results arrive as NDJSON; validation errors come back as plain JSON
+        const contentType = response.headers.get('Content-Type') || '';
+        const result = contentType.includes('application/x-ndjson')
+            ? await readSQLStream(response, partial => displaySQLResults(resultDiv, partial, true))
+            : await response.json();
 
         // Display results
         if (result.success) {
@@ -741,15 +749,56 @@ async function runSQLQuery(questionNum) {
     }
 }
 
+// Read an NDJSON query stream, reporting rows as they arrive
+async function readSQLStream(response, onRows) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const rows = [];
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line);
+
+            if (event.type === 'rows') {
+                rows.push(...event.rows);
+                onRows({ success: true, results: rows, row_count: rows.length });
+            } else if (event.type === 'end') {
+                return { ...event, results: rows };
+            } else if (event.type === 'error') {
+                return event;
+            }
+        }
+    }
+
+    return { success: false, error: 'Connection closed before the query finished' };
+}
+
 // Display SQL results
-function displaySQLResults(container, result) {
+function displaySQLResults(container, result, loading = false) {
     let html = '';
 
     // Result info
+    let status = `${result.row_count} row(s) returned`;
+    if (loading) {
+        status = `${result.row_count} row(s) received, loading more...`;
+    } else if (result.truncated) {
+        status = `Showing the first ${result.row_count} row(s); the result was truncated`;
+    }
+    if (!loading && result.timings) {
+        status += ` in ${Math.round(result.timings.total_ms)} ms`;
+    }
     html += `
         <div class="sql-result-info">
             <strong>✓ Query executed successfully</strong><br>
-            ${result.row_count} row(s) returned
+            ${status}
         </div>
     `;
 
@@ -838,7 +887,8 @@ async function calculateScores() {
             throw new Error('Failed to submit assessment');
         }
 
-        const result = await response.json();
+        const submitted = await response.json();
+        const result = await waitForGrading(submitted.submission_id);
 
         // Display results from backend
         document.getElementById('mcq-score').textContent = result.scores.mcq;
@@ -859,6 +909,31 @@ async function calculateScores() {
     }
 }
 
+// Poll a submission until grading finishes
+async function waitForGrading(submissionId) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/api/submissions/${submissionId}`);
+        if (!response.ok) {
+            throw new Error('Failed to fetch grading status');
+        }
+
+        const status = await response.json();
+        if (status.status === 'done') {
+            return status;
+        }
+        if (status.status === 'failed') {
+            throw new Error(status.error || 'Grading failed');
+        }
+
+        const progress = status.progress;
+        const label = progress && progress.python_total
+            ? `Grading... (${progress.python_graded}/${progress.python_total} problems)`
+            : 'Grading...';
+        document.getElementById('python-score').textContent = label;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Fallback: Calculate scores locally if API is unavailable
 function calculateScoresLocally() {
     let mcqScore = 0;